@@ -1,11 +1,22 @@
-import streamlit as st
-import autogen
-import json
-import matplotlib.pyplot as plt
-import numpy as np
-import PyPDF2
 import time
-import re
+import uuid
+from contextlib import nullcontext
+
+import streamlit as st
+# 重型依赖 (PDF 解析、绘图、numpy、openai SDK) 都推迟到真正用到时才导入，新会话首屏不为它们付费
+from streaming import stream_agent_reply, render_stream
+from debate_memory import DebateMemory
+from transcript_store import Transcript, TranscriptStore
+from pdf_cache import content_key, load_cached
+from summarizer import map_reduce_summary
+from llm_gateway import SERVING_URL, get_gateway
+from debate_core import INIT_TEMPLATE, CATEGORIES, create_agents
+from context_pack import pack_context
+from judge import IncrementalJudge
+from speculation import Speculator
+from autoplay import AutoDebate, turn_messages
+from metrics import METRICS
+from checkpoint import Checkpoint, describe, list_checkpoints, load_checkpoint, resumable
 
 # ==========================================
 # 1. 页面与 CSS 配置
@@ -44,95 +55,162 @@ st.markdown('<div class="main-title">🧠 AI 深度辩论引擎</div>', unsafe_a
 # 2. 核心功能区 (缓存 + 工具函数)
 # ==========================================
 
-@st.cache_data
-def get_pdf_text(uploaded_file):
+def load_pdf(uploaded_file):
+    """逐页解析 PDF：多进程并行 + 按内容哈希的磁盘缓存 (重新上传同一文档直接命中)，返回文档哈希"""
     try:
-        reader = PyPDF2.PdfReader(uploaded_file)
-        content = ""
-        for page in reader.pages:
-            content += page.extract_text()
-        return content
-    except:
+        from pdf_cache import extract_pages
+
+        data = uploaded_file.getvalue()
+        extract_pages(data)
+        return content_key(data)
+    except Exception as e:
+        st.warning(f"⚠️ 文档解析失败：{e}")
+        return None
+
+@st.cache_resource(max_entries=4)
+def get_doc_index(doc_key):
+    """按文档内容哈希共享的 BM25 索引：多个会话上传同一文档只建一份，最多常驻 4 份"""
+    from retrieval import build_index
+
+    return build_index(load_cached(doc_key) or [])
+
+def retrieve_passages(query, k=4):
+    """从已上传文档的索引中检索与本轮最相关的片段"""
+    doc_key = st.session_state.get("doc_key")
+    if doc_key is None or not query:
         return ""
+    from retrieval import format_passages
+
+    return format_passages(get_doc_index(doc_key).search(query, k=k))
+
+def make_retriever(k=4):
+    """给后台线程用的检索函数：索引在主线程取好，线程里不再访问 session_state"""
+    doc_key = st.session_state.get("doc_key")
+    if doc_key is None:
+        return None
+    from retrieval import format_passages
+
+    index = get_doc_index(doc_key)
+    return lambda query: format_passages(index.search(query, k=k))
 
 @st.cache_data
-def summarize_doc(api_key, text):
-    """AI 智能摘要"""
-    if not text or not api_key: return ""
-    input_text = text[:10000] 
-    
-    config_list = [{
-        "model": "deepseek-chat", 
-        "api_key": api_key, 
-        "base_url": "https://api.deepseek.com",
-        "api_type": "openai"
-    }]
-    
-    client = autogen.OpenAIWrapper(config_list=config_list)
-    prompt = f"请阅读以下文档，并提炼出 5-8 个核心论点、关键数据或争议焦点。文档内容：\n{input_text}"
-    try:
-        response = client.create(messages=[{"role": "user", "content": prompt}])
-        return response.choices[0].message.content
-    except:
-        return text[:2000]
+def summarize_doc(api_key, text, _tenant=None):
+    """AI 智能摘要 (Map-Reduce：全文分块并发摘要后再合并)；_tenant 不参与缓存键"""
+    if not text or not api_key: return None
+    # 共享网关：复用长连接，不再每次新建客户端
+    return map_reduce_summary(get_gateway(api_key, tenant=_tenant), text)
+
+@st.fragment(run_every=5)
+def metrics_panel():
+    """侧边栏性能面板：各调用方的延迟分位数、token、重试、缓存命中与估算费用，每 5 秒刷新"""
+    rows = METRICS.summary()
+    if not rows:
+        st.caption("暂无调用记录")
+        return
+    st.metric("累计费用 (估算)", f"${METRICS.total_cost():.4f}")
+    st.dataframe([{
+        "调用": f"{r['kind']}:{r['label']}",
+        "次数": r["calls"],
+        "p50 (s)": round(r["p50"], 2),
+        "p95 (s)": round(r["p95"], 2),
+        "首 token (s)": round(r["ttft_p50"], 2),
+        "输入 tok": r["prompt_tokens"],
+        "输出 tok": r["completion_tokens"],
+        "缓存命中": r["cache_hits"],
+        "重试": r["retries"],
+        "截断": r["truncated"],
+        "提前结束": r["early_stops"],
+        "失败": r["errors"],
+        "取消": r["cancelled"],
+        "费用 ($)": round(r["cost"], 5),
+    } for r in rows], hide_index=True, use_container_width=True)
+    c1, c2 = st.columns(2)
+    c1.download_button("Prometheus", METRICS.prometheus(), file_name="metrics.prom", use_container_width=True)
+    c2.download_button("Trace (JSONL)", METRICS.trace_jsonl(), file_name="trace.jsonl", use_container_width=True)
 
 @st.cache_resource
-def get_agents(api_key, context_text, pro_identity, con_identity):
+def get_transcript_store():
+    store = TranscriptStore()
+    store.purge()
+    return store
+
+@st.cache_resource(max_entries=16)
+def get_agents(api_key, context_text, pro_identity, con_identity, tenant=None):
     """
     初始化 Agents，支持动态身份设定。
-    参数: pro_identity (正方人设), con_identity (反方人设)
-    """
-    base_config = [{
-        "model": "deepseek-chat",
-        "api_key": api_key,
-        "base_url": "https://api.deepseek.com",
-        "api_type": "openai",     
-        "temperature": 0.7,       
-        "max_tokens": 500, # 稍微放宽长度，让特定角色能发挥       
-        "frequency_penalty": 0.6,
-        "presence_penalty": 0.6
-    }]
-    
-    analyst_config = [{
-        "model": "deepseek-chat",
-        "api_key": api_key,
-        "base_url": "https://api.deepseek.com",
-        "api_type": "openai",
-        "temperature": 0.5,
-        "max_tokens": 600
-    }]
-    
-    stop_prompt = """
-    【CRITICAL RULES】:
-    1. DO NOT repeat the user's input or the opponent's argument.
-    2. Start your argument DIRECTLY.
-    3. ONLY generate ONE single turn.
-    4. Speak in Chinese.
-    5. At the very end, append a new line with a concise summary: '【核心论点】：<your core argument in one sentence>'.
+    参数: pro_identity (正方人设), con_identity (反方人设), tenant (排队服务中的租户，即当前会话)
+    缓存最多保留 16 组，超出后按 LRU 淘汰，不会随文档/人设组合无限增长。
     """
-    
-    # 【核心修改】：将用户输入的身份注入到 System Prompt 中
-    pro_prompt = f"【角色设定】：你是正方辩手，你的身份是【{pro_identity}】。\n【参考资料】：{context_text}\n请完全沉浸在你的角色中，使用该角色特有的视角、专业术语和语气进行辩论。{stop_prompt}"
-    con_prompt = f"【角色设定】：你是反方辩手，你的身份是【{con_identity}】。\n【参考资料】：{context_text}\n请完全沉浸在你的角色中，使用该角色特有的视角、专业术语和语气进行辩论。{stop_prompt}"
-    
-    pro = autogen.AssistantAgent("Pro", system_message=pro_prompt, llm_config={"config_list": base_config})
-    con = autogen.AssistantAgent("Con", system_message=con_prompt, llm_config={"config_list": base_config})
-    
-    analyst = autogen.AssistantAgent(
-        "Analyst", 
-        llm_config={"config_list": analyst_config}, 
-        system_message="Strict judge. Output JSON ONLY."
-    )
-    
-    return pro, con, analyst
+    return create_agents(api_key, context_text, pro_identity, con_identity, tenant)
+
+def restore_checkpoint(path, replay=False):
+    """按钮回调：从存档恢复会话 (replay=True 时只读回放)，全程不调用 LLM"""
+    # 先校验存档，再动会话状态：失败时当前辩论保持原样
+    try:
+        state = load_checkpoint(path)
+    except (OSError, ValueError) as e:
+        st.warning(f"存档无法读取：{e}")
+        return
+    if not resumable(state):
+        st.warning("该存档缺少议题或正反方身份 (来自命令行脚本)，请用 `python checkpoint.py show` 查看")
+        return
+    meta = state.meta
+    ss = st.session_state
+    close_checkpoint()
+    ss.speculator.discard()
+    if ss.autoplay: ss.autoplay.stop()
+    ss.autoplay = None
+    ss.transcript.clear()
+    for msg in state.messages():
+        ss.transcript.append(msg.speaker, msg.content, round=msg.round)
+    ss.memory = DebateMemory.from_history(state.messages())
+    turns = state.debater_turns()
+    ss.judge = IncrementalJudge(meta["topic"], meta["pro"], meta["con"])
+    ss.judge.restore(state.scored(), turns[-1]["content"] if turns else None)
+    ss.topic, ss.pro_id, ss.con_id = meta["topic"], meta["pro"], meta["con"]
+    ss.doc_summary = meta.get("context", "")
+    ss.round_index = state.round_index
+    ss.target_round = min(10, max(2, meta.get("target_round", 6), state.round_index))
+    ss.verdict = state.verdict or (state.rescore() if replay else None)
+    ss.replay = replay
+    if not replay:
+        # 续辩：新的发言与评分继续追加到同一个存档
+        ss.checkpoint = ss.transcript.checkpoint = ss.judge.checkpoint = Checkpoint.reopen(state)
+    ss.debate_started = True
+
+def save_verdict(verdict):
+    st.session_state.verdict = verdict
+    if st.session_state.checkpoint is not None:
+        st.session_state.checkpoint.record_verdict(verdict)
+        # 裁决之后不再有新发言，释放文件句柄 (迟到的写入仍会追加)
+        st.session_state.checkpoint.close()
+
+def close_checkpoint():
+    """换场、恢复或重置前关闭当前存档，避免每场辩论泄漏一个文件句柄"""
+    if st.session_state.checkpoint is not None:
+        st.session_state.checkpoint.close()
+    st.session_state.checkpoint = None
 
 # ==========================================
 # 3. 状态管理
 # ==========================================
-if "chat_history" not in st.session_state: st.session_state.chat_history = [] 
+# 发言记录只在内存保留最近若干条，其余存入 SQLite
+if "transcript" not in st.session_state: st.session_state.transcript = Transcript(get_transcript_store())
 if "round_index" not in st.session_state: st.session_state.round_index = 0 
+if "memory" not in st.session_state: st.session_state.memory = DebateMemory()
 if "debate_started" not in st.session_state: st.session_state.debate_started = False
 if "doc_summary" not in st.session_state: st.session_state.doc_summary = ""
+if "doc_key" not in st.session_state: st.session_state.doc_key = None
+if "judge" not in st.session_state: st.session_state.judge = None
+if "speculator" not in st.session_state: st.session_state.speculator = Speculator()
+if "autoplay" not in st.session_state: st.session_state.autoplay = None
+if "verdict" not in st.session_state: st.session_state.verdict = None
+# 辩论存档：每轮发言 / 评分 / 裁决追加写入，重启或会话超时后可从侧边栏恢复
+if "checkpoint" not in st.session_state: st.session_state.checkpoint = None
+if "replay" not in st.session_state: st.session_state.replay = False
+if "target_round" not in st.session_state: st.session_state.target_round = 6
+# 多用户部署 (DEBATE_SERVING_URL)：每个会话是排队服务中的一个租户，按会话限速
+if "tenant" not in st.session_state: st.session_state.tenant = uuid.uuid4().hex[:12] if SERVING_URL else None
 # 新增：存储用户设定的角色
 if "pro_id" not in st.session_state: st.session_state.pro_id = "资深专家"
 if "con_id" not in st.session_state: st.session_state.con_id = "犀利批评家"
@@ -143,30 +221,75 @@ if "con_id" not in st.session_state: st.session_state.con_id = "犀利批评家"
 with st.sidebar:
     st.header("⚙️ 会议控制台")
     api_key = st.text_input("DeepSeek API Key", value="sk-xxxxxxxxxxxxxxxx", type="password") 
-    target_round = st.slider("计划发言总次数", 2, 10, 6) 
+    target_round = st.slider("计划发言总次数", 2, 10, key="target_round") 
+    speculative = st.toggle("⚡ 预生成下一轮", value=False,
+                            help="上一轮结束后立即在后台生成下一轮发言；递纸条时自动作废并按指令重新生成")
     
     st.markdown("---")
     st.header("📂 RAG 知识库")
     uploaded_file = st.file_uploader("上传参考文档 (PDF)", type=["pdf"])
     
     if uploaded_file is not None:
-        raw_text = get_pdf_text(uploaded_file)
+        if st.session_state.get("doc_index_id") != uploaded_file.file_id:
+            with st.spinner("📄 正在解析文档..."):
+                # 会话里只保存文档哈希；页面文本在磁盘缓存，索引在跨会话共享的资源缓存里
+                st.session_state.doc_key = load_pdf(uploaded_file)
+            st.session_state.doc_index_id = uploaded_file.file_id
+        raw_text = ""
+        if st.session_state.doc_key and not st.session_state.doc_summary:
+            raw_text = "\n".join(load_cached(st.session_state.doc_key) or [])
         if raw_text:
             if "sk-" in api_key and not st.session_state.doc_summary:
                 with st.spinner("🧠 AI 正在阅读文档并生成摘要..."):
-                    summary = summarize_doc(api_key, raw_text)
-                    st.session_state.doc_summary = summary
-                    st.success("✅ 摘要已生成")
+                    try:
+                        result = summarize_doc(api_key, raw_text, st.session_state.tenant)
+                        st.session_state.doc_summary = result["summary"]
+                        timings = result["timings"]
+                        st.success("✅ 摘要已生成")
+                        st.caption(f"{result['chunks']} 个分块 · map {timings['map']:.1f}s · reduce {timings['reduce']:.1f}s · 总计 {timings['total']:.1f}s")
+                        if result["errors"]:
+                            st.warning(f"⚠️ {len(result['errors'])} 个分块摘要失败，已跳过")
+                    except Exception as e:
+                        st.warning(f"⚠️ 摘要生成失败，改用原文开头：{e}")
+                        st.session_state.doc_summary = raw_text[:3000]
             elif not st.session_state.doc_summary:
                  st.session_state.doc_summary = raw_text[:3000]
+        if st.session_state.doc_summary:
+            packed = pack_context(st.session_state.doc_summary)
+            st.caption(f"📦 参考资料压缩：{packed.raw_tokens} → {packed.packed_tokens} tokens/轮 (丢弃重复或超额 {packed.dropped} 段)，"
+                       f"本场已节省约 {packed.saved_tokens * st.session_state.round_index} tokens")
 
     st.markdown("---")
     if st.button("🔄 重置辩论", use_container_width=True):
-        st.session_state.chat_history = []
+        st.session_state.transcript.clear()
+        st.session_state.memory = DebateMemory()
+        st.session_state.judge = None
+        st.session_state.speculator.discard()
+        if st.session_state.autoplay: st.session_state.autoplay.stop()
+        st.session_state.autoplay = None
+        st.session_state.verdict = None
+        close_checkpoint()
+        st.session_state.replay = False
         st.session_state.round_index = 0
         st.session_state.debate_started = False
         st.rerun()
 
+    with st.expander("💾 存档 (断点续辩 / 回放)"):
+        saved = list_checkpoints(where=resumable)
+        if saved:
+            labels = {state.path: describe(state) for state in saved}
+            choice = st.selectbox("最近的辩论", list(labels), format_func=labels.get, key="checkpoint_choice")
+            col_resume, col_replay = st.columns(2)
+            col_resume.button("▶️ 继续", use_container_width=True, on_click=restore_checkpoint, args=(choice,))
+            col_replay.button("📼 回放", use_container_width=True, on_click=restore_checkpoint, args=(choice, True))
+            st.caption("继续：恢复记录、评分与资料后接着辩论；回放：只重新渲染并用已存评分重新裁决，不调用 LLM")
+        else:
+            st.caption("暂无存档，开启辩论后每轮自动保存")
+
+    st.markdown("---")
+    with st.expander("📊 性能面板 (延迟 / token / 费用)"):
+        metrics_panel()
+
 # ==========================================
 # 5. 主界面布局 (输入区)
 # ==========================================
@@ -210,82 +333,206 @@ if not st.session_state.debate_started:
             st.session_state.pro_id = user_pro_id
             st.session_state.con_id = user_con_id
             
-            init_msg = f"议题：‘{topic}’。请正方发言，反方反驳。"
-            st.session_state.chat_history.append({
-                "role": "user", "content": init_msg, "speaker": "System", "is_animated": True
+            st.session_state.replay = False
+            close_checkpoint()
+            checkpoint = Checkpoint.create({
+                "source": "app", "topic": topic, "pro": user_pro_id, "con": user_con_id,
+                "context": st.session_state.doc_summary, "target_round": target_round,
             })
+            st.session_state.checkpoint = st.session_state.transcript.checkpoint = checkpoint
+            
+            init_msg = INIT_TEMPLATE.format(topic=topic)
+            st.session_state.transcript.append("System", init_msg)
+            st.session_state.memory = DebateMemory()
+            st.session_state.memory.set_opening(init_msg)
+            st.session_state.judge = IncrementalJudge(topic, user_pro_id, user_con_id)
+            st.session_state.judge.checkpoint = checkpoint
+            st.session_state.verdict = None
             st.rerun()
 
 # ==========================================
 # 6. 核心逻辑 (Fragment 局部刷新)
 # ==========================================
 
+RECENT_TURNS = 6  # 每次重绘完整展示的最近发言条数
+PAGE_SIZE = 10    # 较早记录每页条数
+
+def render_message(msg):
+    if msg.speaker == "Instruction":
+        st.warning(f"🕵️ {msg.content}")
+    elif msg.speaker == "Pro":
+        col_left, col_mid, col_right = st.columns([10, 1, 10])
+        with col_left:
+            # 显示时带上角色名，增加沉浸感
+            st.info(f"**🟦 正方 ({st.session_state.pro_id}):**\n\n{msg.content}")
+    elif msg.speaker == "Con":
+        col_left, col_mid, col_right = st.columns([10, 1, 10])
+        with col_right:
+            st.error(f"**🟥 反方 ({st.session_state.con_id}):**\n\n{msg.content}")
+
+def build_turn_messages(speaker_tag):
+    """组装 speaker_tag 本轮的输入消息 (增量上下文 + RAG 片段)"""
+    return turn_messages(st.session_state.memory, st.session_state.topic, speaker_tag, retrieve_passages)
+
+def live_caption():
+    if not (st.session_state.judge and st.session_state.judge.futures):
+        return ""
+    live, pending = st.session_state.judge.tallies()
+    pro_avg = sum(live["Pro"].values()) / len(CATEGORIES)
+    con_avg = sum(live["Con"].values()) / len(CATEGORIES)
+    return f"⚖️ 实时评分：正方 {pro_avg:.1f} | 反方 {con_avg:.1f}" + (f" (还有 {pending} 轮评分中)" if pending else "")
+
+def follow_autoplay(runner, chat_container, live_container, status_box, shown, min_interval=0.08):
+    """
+    在本次重绘内跟随自动对战，直到整场结束：新落地的发言追加到记录区，正在生成的发言在占位区刷新。
+    中途用户操作触发重绘只会结束这个循环，后台生成不受影响，下次重绘重新接上。
+    """
+    with live_container:
+        col_left, col_mid, col_right = st.columns([10, 1, 10])
+        boxes = {"Pro": col_left.empty(), "Con": col_right.empty()}
+    while True:
+        runner.wait(timeout=0.5)
+        with runner.lock:
+            landed = runner.transcript.page(shown + 1, len(runner.transcript))
+            live = runner.live
+        if landed:
+            for box in boxes.values():
+                box.empty()
+            with chat_container:
+                for msg in landed:
+                    render_message(msg)
+            shown = landed[-1].seq
+        if live:
+            tag, text = live
+            identity = st.session_state.pro_id if tag == "Pro" else st.session_state.con_id
+            header = f"**🟦 正方 ({identity}):**\n\n" if tag == "Pro" else f"**🟥 反方 ({identity}):**\n\n"
+            show = boxes[tag].info if tag == "Pro" else boxes[tag].error
+            show(header + (text + " ▌" if text else f"_{identity} 正在深度思考..._"))
+        status_box.caption(f"🤖 自动对战中：已完成 {runner.round} / {runner.target_round} 轮  \n{live_caption()}")
+        if runner.finished:
+            return
+        # 合并渲染批次，避免每个 token 都重绘一次
+        time.sleep(min_interval)
+
+def render_verdict(data):
+    c_res1, c_res2 = st.columns([2, 3])
+    with c_res1:
+        if data['Winner'] is None:
+            # 某一方没有评分成功的发言：不判胜负
+            winner_color, title, winner_text = "#8A8F98", "⚖️ 未决", "评分不足"
+        elif data['Winner'] == "Pro":
+            winner_color, title, winner_text = "#4A90E2", "🏆 胜者", f"🟦 正方 ({st.session_state.pro_id})"
+        else:
+            winner_color, title, winner_text = "#E94E77", "🏆 胜者", f"🟥 反方 ({st.session_state.con_id})"
+        st.markdown(f"""
+        <div style="background-color:{winner_color}; padding:20px; border-radius:10px; color:white; text-align:center;">
+            <h3>{title}</h3><h1>{winner_text}</h1>
+        </div>
+        <div style="background-color:#f0f2f6; padding:15px; border-radius:10px; margin-top:15px; color:#333; border-left: 5px solid {winner_color};">
+            <b>📝 点评：</b> {data['Comment']}
+        </div>
+        """, unsafe_allow_html=True)
+    with c_res2:
+        # 纯 SVG 雷达图：浏览器端绘制，相同得分直接命中缓存，不再每次创建并栅格化 matplotlib 图
+        from radar_chart import verdict_svg
+
+        svg = verdict_svg(data, CATEGORIES, f"正方 ({st.session_state.pro_id})", f"反方 ({st.session_state.con_id})")
+        st.markdown(f'<div style="text-align:center;">{svg}</div>', unsafe_allow_html=True)
+
 @st.fragment 
 def debate_ui_fragment():
     if not st.session_state.debate_started:
         return
 
+    # 参考资料在 create_agents 内去重压缩，并作为正反方共用的前缀消息 (可命中前缀缓存)
     context_data = st.session_state.doc_summary if st.session_state.doc_summary else ""
-    rag_context = f"【核心参考资料】：\n{context_data}" if context_data else ""
     
-    # 【核心调用】：传入用户设定的身份
-    pro_agent, con_agent, analyst_agent = get_agents(api_key, rag_context, st.session_state.pro_id, st.session_state.con_id)
+    # 【核心调用】：传入用户设定的身份；Agent 推迟到第一次发言 (或预生成 / 自动对战) 时才创建
+    def agents():
+        return get_agents(api_key, context_data, st.session_state.pro_id, st.session_state.con_id, st.session_state.tenant)
+
+    # 自动对战结束 (跑完或被停止)：把轮次与裁决同步回会话状态
+    runner = st.session_state.autoplay
+    if runner is not None and runner.finished:
+        st.session_state.round_index = runner.round
+        if runner.verdict is not None:
+            save_verdict(runner.verdict)
+        if runner.error is not None:
+            st.error(f"Error: {runner.error}")
+        st.session_state.autoplay = runner = None
 
     # --- A. 渲染历史 ---
     st.markdown("### 🎙️ 辩论实况")
     chat_container = st.container()
     
     with chat_container:
-        for idx, msg in enumerate(st.session_state.chat_history):
-            speaker = msg.get('speaker', 'Unknown')
-            content = msg['content']
-            round_num = msg.get('round', '-')
-            already_animated = msg.get("is_animated", False)
-
-            if speaker == "Instruction":
-                st.warning(f"🕵️ {content}")
-                st.session_state.chat_history[idx]["is_animated"] = True
-            elif speaker == "System": continue
-            elif speaker == "Pro":
-                col_left, col_mid, col_right = st.columns([10, 1, 10])
-                with col_left:
-                    # 显示时带上角色名，增加沉浸感
-                    full_text = f"**🟦 正方 ({st.session_state.pro_id}):**\n\n{content}"
-                    if not already_animated:
-                        message_box = st.empty()
-                        current_text = ""
-                        for char in full_text:
-                            current_text += char
-                            message_box.info(current_text) 
-                            time.sleep(0.03) 
-                        st.session_state.chat_history[idx]["is_animated"] = True
-                    else:
-                        st.info(full_text)
-            elif speaker == "Con":
-                col_left, col_mid, col_right = st.columns([10, 1, 10])
-                with col_right:
-                    full_text = f"**🟥 反方 ({st.session_state.con_id}):**\n\n{content}"
-                    if not already_animated:
-                        message_box = st.empty()
-                        current_text = ""
-                        for char in full_text:
-                            current_text += char
-                            message_box.error(current_text)
-                            time.sleep(0.03)
-                        st.session_state.chat_history[idx]["is_animated"] = True
-                    else:
-                        st.error(full_text)
+        # 虚拟化渲染：每次重绘只画最近 RECENT_TURNS 条 (已在内存中)，
+        # 更早的发言默认收起，展开后也只按页从磁盘读取一页，重绘成本与总轮数无关
+        transcript = st.session_state.transcript
+        # 自动对战进行中时记录由后台线程写入，读取快照需持锁
+        with runner.lock if runner else nullcontext():
+            recent = list(transcript.recent)[-RECENT_TURNS:]
+            shown = len(transcript) - 1
+        first_recent = recent[0].seq if recent else len(transcript)
+        older_count = first_recent - 1  # seq 0 为开场的系统消息，不显示
+        if older_count > 0:
+            if st.toggle(f"📜 查看较早的 {older_count} 条记录", key="show_older"):
+                pages = (older_count + PAGE_SIZE - 1) // PAGE_SIZE
+                page = st.selectbox("页码", range(pages), index=pages - 1,
+                                    format_func=lambda p: f"第 {p + 1} / {pages} 页", key="older_page")
+                start = 1 + page * PAGE_SIZE
+                for msg in transcript.page(start, min(first_recent, start + PAGE_SIZE)):
+                    render_message(msg)
+                st.markdown("---")
+        for msg in recent:
+            render_message(msg)
+
+    # 流式发言的占位区：新一轮发言直接在这里逐批刷新
+    live_container = st.container()
 
     st.markdown("---")
 
     # --- B. 控制台 ---
-    if st.session_state.round_index < target_round:
+    if st.session_state.replay:
+        st.info("📼 回放模式：记录与评分均来自存档，不调用 LLM")
+        data = st.session_state.verdict
+        if data is not None and any(data["Turns"].values()):
+            render_verdict(data)
+
+    elif runner is not None:
+        st.markdown("""
+        <div class="tactical-console">
+            <h3 style="margin:0; color: #333;">🕹️ 战术指挥台</h3>
+            <p>🤖 自动对战进行中，纸条会在下一轮发言开始前注入</p>
+        </div>
+        """, unsafe_allow_html=True)
+        status_box = st.empty()
+        with st.form("autoplay_note", clear_on_submit=True, border=False):
+            note = st.text_input("💡 递纸条 (输入指令干预下一轮发言)", placeholder="给下一位发言者的秘密指令...")
+            if st.form_submit_button("📩 递出纸条") and note:
+                runner.inject(note)
+                st.toast("锦囊已排队，将注入给下一位发言者！")
+        if st.button("⏹ 停止自动对战", use_container_width=True):
+            runner.stop()
+            st.toast("本轮发言结束后停止")
+
+        follow_autoplay(runner, chat_container, live_container, status_box, shown)
+        # 整场只在结束时重绘一次，显示裁决
+        st.rerun()
+
+    elif st.session_state.round_index < target_round:
         
         next_is_pro = (st.session_state.round_index % 2 == 0)
         # 动态显示下一位发言者的身份
         next_role_name = st.session_state.pro_id if next_is_pro else st.session_state.con_id
         next_color = "#4A90E2" if next_is_pro else "#E94E77"
         current_speaker_tag = "Pro" if next_is_pro else "Con"
+
+        # 推测式预生成：没有锦囊时下一轮只取决于已有记录，提前在后台生成
+        speculator = st.session_state.speculator
+        spec_key = (current_speaker_tag, st.session_state.round_index, len(st.session_state.transcript))
+        if speculative:
+            speculator.start(spec_key, agents()[0 if next_is_pro else 1], build_turn_messages(current_speaker_tag))
         
         st.markdown(f"""
         <div class="tactical-console">
@@ -294,6 +541,11 @@ def debate_ui_fragment():
         </div>
         """, unsafe_allow_html=True)
 
+        if st.session_state.judge and st.session_state.judge.futures:
+            st.caption(live_caption())
+        if speculative:
+            st.caption("⚡ 下一轮发言已预生成" if speculator.ready(spec_key) else "⚡ 正在后台预生成下一轮发言...")
+
         col_input, col_btn = st.columns([3, 1])
         
         with col_input:
@@ -308,112 +560,87 @@ def debate_ui_fragment():
             
             if st.button(btn_label, use_container_width=True):
                 
-                # 插入锦囊
+                # 插入锦囊 (预生成的发言没有看到这条指令，作废重来)
                 if user_instruction:
+                    speculator.discard()
                     instruction_msg = f"【给 {next_role_name} 的独家指令】：{user_instruction}"
-                    st.session_state.chat_history.append({
-                        "role": "user", "content": instruction_msg, "speaker": "Instruction", "is_animated": True
-                    })
+                    st.session_state.transcript.append("Instruction", instruction_msg)
+                    st.session_state.memory.add_instruction(instruction_msg)
                     st.toast(f"锦囊已注入给 {next_role_name}！")
                 
                 # 生成回复
+                pro_agent, con_agent, analyst_agent = agents()
                 speaker_agent = pro_agent if next_is_pro else con_agent
-                
-                with st.spinner(f"{next_role_name} 正在深度思考..."):
-                    try:
-                        clean_history = []
-                        total_msgs = len(st.session_state.chat_history)
-                        
-                        for i, m in enumerate(st.session_state.chat_history):
-                            m_speaker = m.get('speaker', 'Unknown')
-                            
-                            # 角色映射
-                            if m_speaker == current_speaker_tag:
-                                mapped_role = "assistant"
-                            elif m_speaker == "Instruction":
-                                mapped_role = "user"
-                            else:
-                                mapped_role = "user"
-
-                            if m_speaker == "Instruction":
-                                if i == total_msgs - 1: 
-                                     hidden_prompt = f" {m['content']} \n(【强制】：只输出一轮发言，不要复述指令！)"
-                                     clean_history.append({"role": "user", "content": hidden_prompt})
-                            else:
-                                clean_history.append({"role": mapped_role, "content": m["content"]})
-                        
-                        reply = speaker_agent.generate_reply(messages=clean_history)
-                        if not reply: reply = "（沉默）"
-                        
-                        st.session_state.chat_history.append({
-                            "role": "user", 
-                            "content": reply,
-                            "speaker": current_speaker_tag, 
-                            "round": st.session_state.round_index + 1,
-                            "is_animated": False 
-                        })
-                        
-                        st.session_state.round_index += 1
-                        st.rerun() 
-                        
-                    except Exception as e:
-                        st.error(f"Error: {e}")
+                try:
+                    # 流式输出：首个 token 到达即可见，按批次合并重绘
+                    if next_is_pro:
+                        header = f"**🟦 正方 ({st.session_state.pro_id}):**\n\n"
+                    else:
+                        header = f"**🟥 反方 ({st.session_state.con_id}):**\n\n"
+                    with live_container:
+                        col_left, col_mid, col_right = st.columns([10, 1, 10])
+                        message_box = (col_left if next_is_pro else col_right).empty()
+                    show = message_box.info if next_is_pro else message_box.error
+                    show(f"{header}_{next_role_name} 正在深度思考..._")
+
+                    def render(text, done):
+                        show(header + text + ("" if done else " ▌"))
+
+                    # 命中预生成结果直接展示 (仍在生成则跟随其流式输出)；未开启、已作废或失败时正常流式生成
+                    reply = None
+                    chunks = speculator.take(spec_key) if speculative and not user_instruction else None
+                    if chunks is not None:
+                        try:
+                            reply = render_stream(chunks, render)
+                        except Exception:
+                            reply = None
+                    if not reply:
+                        clean_history = build_turn_messages(current_speaker_tag)
+                        reply = render_stream(stream_agent_reply(speaker_agent, clean_history), render)
+                    if not reply: reply = "（沉默）"
+                    
+                    st.session_state.transcript.append(current_speaker_tag, reply, round=st.session_state.round_index + 1)
+                    st.session_state.memory.add_turn(current_speaker_tag, reply)
+                    # 逐轮评分在后台进行，与下一位辩手的发言并行
+                    st.session_state.judge.submit(analyst_agent, current_speaker_tag, reply)
+                    
+                    st.session_state.round_index += 1
+                    st.rerun() 
+                    
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+        # 自动对战：后台一次跑完剩余轮次，页面只跟随刷新
+        if st.button(f"⏩ 自动进行剩余 {target_round - st.session_state.round_index} 轮", use_container_width=True):
+            speculator.discard()
+            pro_agent, con_agent, analyst_agent = agents()
+            runner = AutoDebate(
+                {"Pro": pro_agent, "Con": con_agent}, analyst_agent,
+                st.session_state.transcript, st.session_state.memory, st.session_state.judge,
+                st.session_state.topic, {"Pro": st.session_state.pro_id, "Con": st.session_state.con_id},
+                st.session_state.round_index, target_round, retrieve=make_retriever(),
+            )
+            if user_instruction:
+                runner.inject(user_instruction)
+            st.session_state.autoplay = runner.start()
+            st.rerun()
 
     # --- C. 评分 ---
     else:
         st.success("✅ 辩论结束！")
         if st.button("⚖️ 请求裁判裁决", use_container_width=True):
-             with st.spinner("裁判正在回顾全场..."):
-                clean_content_only = [m['content'] for m in st.session_state.chat_history if m.get('speaker') != "Instruction"]
-                history_text = str(clean_content_only)
-                
-                prompt = f"""
-                Review debate history: {history_text}
-                Evaluate based on the identity: Pro={st.session_state.pro_id}, Con={st.session_state.con_id}.
-                Output JSON ONLY:
-                {{
-                    "Pro": {{"Logic": 85, "Evidence": 90, "Expression": 88}},
-                    "Con": {{"Logic": 80, "Evidence": 85, "Expression": 92}},
-                    "Winner": "Pro",
-                    "Comment": "Analysis."
-                }}
-                """
+             with st.spinner("裁判正在汇总各轮评分..."):
                 try:
-                    res = analyst_agent.generate_reply(messages=[{"role": "user", "content": prompt}])
-                    match = re.search(r'\{.*\}', res, re.DOTALL)
-                    if match:
-                        data = json.loads(match.group())
-                        
-                        c_res1, c_res2 = st.columns([2, 3])
-                        with c_res1:
-                            winner_color = "#4A90E2" if data['Winner'] == "Pro" else "#E94E77"
-                            winner_text = f"🟦 正方 ({st.session_state.pro_id})" if data['Winner'] == "Pro" else f"🟥 反方 ({st.session_state.con_id})"
-                            st.markdown(f"""
-                            <div style="background-color:{winner_color}; padding:20px; border-radius:10px; color:white; text-align:center;">
-                                <h3>🏆 胜者</h3><h1>{winner_text}</h1>
-                            </div>
-                            <div style="background-color:#f0f2f6; padding:15px; border-radius:10px; margin-top:15px; color:#333; border-left: 5px solid {winner_color};">
-                                <b>📝 点评：</b> {data['Comment']}
-                            </div>
-                            """, unsafe_allow_html=True)
-                        with c_res2:
-                            categories = ['Logic', 'Evidence', 'Expression']
-                            pro_scores = [int(data['Pro'][c]) for c in categories]
-                            con_scores = [int(data['Con'][c]) for c in categories]
-                            pro_scores += pro_scores[:1]; con_scores += con_scores[:1]
-                            angles = np.linspace(0, 2*np.pi, len(categories), endpoint=False).tolist()
-                            angles += angles[:1]
-                            fig, ax = plt.subplots(figsize=(5, 5), subplot_kw=dict(polar=True))
-                            ax.set_ylim(0, 100)
-                            ax.plot(angles, pro_scores, 'o-', color='#4A90E2', label='Pro')
-                            ax.fill(angles, pro_scores, alpha=0.2, color='#4A90E2')
-                            ax.plot(angles, con_scores, 'o-', color='#E94E77', label='Con')
-                            ax.fill(angles, con_scores, alpha=0.2, color='#E94E77')
-                            ax.set_xticks(angles[:-1]); ax.set_xticklabels(categories, fontsize=12, fontweight='bold')
-                            ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
-                            st.pyplot(fig)
-                    else: st.error("评分解析失败")
+                    # 各轮已在后台评分，这里只等待尚未完成的评分并汇总，不再发起整场回顾请求
+                    save_verdict(st.session_state.judge.verdict())
+                except Exception as e: st.error(f"评分失败: {e}")
+        # 自动对战在最后一轮落地时已汇总好裁决，直接展示
+        data = st.session_state.verdict
+        if data is not None:
+            if any(data["Turns"].values()):
+                try: render_verdict(data)
                 except Exception as e: st.error(f"评分失败: {e}")
+            else: st.error("各轮评分均失败，无法裁决")
 
 if st.session_state.debate_started:
     debate_ui_fragment()
\ No newline at end of file
@@ -0,0 +1,129 @@
+import threading
+from collections import deque
+
+from streaming import consume, stream_agent_reply
+
+# ==========================================
+# 自动对战 (后台线程一次跑完全部轮次)
+# ==========================================
+# 生成在后台线程里按轮次连续进行，页面只是消费者：边生成边刷新当前发言，
+# 整场辩论不再需要每轮一次 st.rerun()。页面重绘 (例如用户递纸条) 不会打断生成，
+# 纸条进入队列，在下一轮开始前注入；最后一轮落地后立即在后台汇总裁决。
+
+SPEAKER_TAGS = ("Pro", "Con")
+
+
+def turn_messages(memory, topic, speaker_tag, retrieve=None):
+    """组装 speaker_tag 本轮的输入消息 (增量上下文 + RAG 片段)"""
+    # 增量上下文：直接取该辩手已维护好的消息日志，无需每轮重扫全部历史
+    clean_history = memory.messages_for(speaker_tag)
+
+    # RAG 检索：以议题 + 最近发言/锦囊为查询，只把 top-k 片段插在最后一条消息之前
+    if retrieve is not None:
+        query = " ".join([topic] + [m["content"] for m in clean_history[-2:]])
+        passages = retrieve(query)
+        if passages:
+            clean_history = clean_history[:-1] + [{"role": "user", "content": passages}] + clean_history[-1:]
+    return clean_history
+
+
+class AutoDebate:
+    """
+    一场辩论的自动对战线程。
+    transcript / memory / judge 由本线程写入，页面读取时需持有 lock。
+    参数: start_round (已完成轮数), target_round (计划总轮数), retrieve (query -> 参考片段，可为 None)
+    """
+
+    def __init__(self, agents, analyst, transcript, memory, judge, topic, identities,
+                 start_round, target_round, retrieve=None):
+        self.agents = agents            # {"Pro": agent, "Con": agent}
+        self.analyst = analyst
+        self.transcript = transcript
+        self.memory = memory
+        self.judge = judge
+        self.topic = topic
+        self.identities = identities    # {"Pro": 身份, "Con": 身份}
+        self.round = start_round
+        self.target_round = target_round
+        self.retrieve = retrieve
+        self.lock = threading.Lock()
+        self.changed = threading.Condition()
+        self.live = None                # (speaker_tag, 已生成的文本)
+        self.error = None
+        self.verdict = None
+        self.finished = False
+        self._instructions = deque()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="autoplay", daemon=True)
+
+    # --- 控制 ---
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """当前这一轮说完后停止"""
+        self._stop.set()
+
+    def inject(self, instruction):
+        """递纸条：在下一轮发言开始前注入"""
+        self._instructions.append(instruction)
+
+    @property
+    def running(self):
+        return not self.finished
+
+    def next_speaker(self):
+        return SPEAKER_TAGS[self.round % 2]
+
+    def wait(self, timeout):
+        """阻塞到有新进展 (新文本片段、新一轮落地或结束) 或超时"""
+        with self.changed:
+            self.changed.wait(timeout)
+
+    def _notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    # --- 后台循环 ---
+    def _run(self):
+        try:
+            while self.round < self.target_round and not self._stop.is_set():
+                self._play_turn()
+            if self.round >= self.target_round:
+                # 各轮已在后台评分，这里只等待最后几轮评分完成并汇总
+                self.verdict = self.judge.verdict()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.live = None
+            self.finished = True
+            self._notify()
+
+    def _play_turn(self):
+        tag = self.next_speaker()
+        with self.lock:
+            while self._instructions:
+                instruction_msg = f"【给 {self.identities[tag]} 的独家指令】：{self._instructions.popleft()}"
+                self.transcript.append("Instruction", instruction_msg)
+                self.memory.add_instruction(instruction_msg)
+            messages = turn_messages(self.memory, self.topic, tag, self.retrieve)
+
+        self.live = (tag, "")
+        self._notify()
+
+        def on_text(text):
+            self.live = (tag, text)
+            self._notify()
+
+        # 存档与上下文里保存裁剪后的整轮发言，与批量运行一致
+        reply = consume(stream_agent_reply(self.agents[tag], messages), on_text) or "（沉默）"
+
+        with self.lock:
+            self.transcript.append(tag, reply, round=self.round + 1)
+            self.memory.add_turn(tag, reply)
+            self.round += 1
+            self.live = None
+        # 逐轮评分在后台进行，与下一位辩手的生成并行
+        self.judge.submit(self.analyst, tag, reply)
+        self._notify()
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from checkpoint import Checkpoint, load_checkpoint
+from debate_core import INIT_TEMPLATE, create_agents
+from debate_memory import DebateMemory
+from judge import aggregate, ascore_turn
+from llm_gateway import BASE_URL, RetryPolicy, get_gateway
+
+# ==========================================
+# 无界面批量辩论运行器
+# ==========================================
+# 读取 JSONL (每行一个议题 + 正反方身份)，在 asyncio 上并发驱动多场辩论，
+# 经共享 LLM 网关统一限速 (令牌桶) 与指数退避重试；每轮发言落地即并行评分，
+# 每场结束立即把全文与汇总后的裁判评分写入输出 JSONL。
+# 指定 --checkpoint-dir 时每轮发言与评分都写入存档，--resume 会从中断的那一轮接着跑。
+#
+# 用法：
+#   python batch_runner.py topics.jsonl -o results.jsonl --concurrency 16 --rps 5
+# 输入行示例：
+#   {"id": "t1", "topic": "AI 会取代程序员吗？", "pro": "资深架构师", "con": "AI 伦理专家"}
+
+DEFAULT_PRO = "资深技术架构师"
+DEFAULT_CON = "AI 安全伦理专家"
+
+
+async def run_debate(job, gateway, args):
+    """
+    跑完一场辩论并请裁判评分，返回可直接写入 JSONL 的记录。
+    准备阶段出错 (输入行缺少 topic、存档无法打开等) 同样返回带 error 的记录，不会中断整批任务。
+    """
+    started = time.perf_counter()
+    try:
+        rounds = int(job.get("rounds", args.rounds))
+        identities = {"Pro": job.get("pro", DEFAULT_PRO), "Con": job.get("con", DEFAULT_CON)}
+        pro, con, analyst = create_agents(args.api_key, job.get("context", ""), identities["Pro"], identities["Con"])
+        record = {"id": job["id"], "topic": job["topic"], "pro": identities["Pro"], "con": identities["Con"]}
+        checkpoint, state = open_checkpoint(job, args, identities, rounds)
+    except Exception as e:
+        return {"id": job.get("id"), "error": f"{type(e).__name__}: {e}",
+                "elapsed": round(time.perf_counter() - started, 3)}
+    try:
+        return await play_debate(gateway, {"Pro": pro, "Con": con}, analyst, job["topic"], identities, rounds, record,
+                                 checkpoint, state)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+
+def open_checkpoint(job, args, identities, rounds):
+    """返回 (存档, 可续跑的已有状态)；--resume 且存档存在时续写，否则新建"""
+    if not args.checkpoint_dir:
+        return None, None
+    path = os.path.join(args.checkpoint_dir, f"{job['id']}.jsonl")
+    if args.resume and os.path.exists(path):
+        try:
+            state = load_checkpoint(path)
+            return Checkpoint.reopen(state), state
+        except ValueError:
+            pass
+    meta = {"source": "batch", "topic": job["topic"], "pro": identities["Pro"], "con": identities["Con"],
+            "context": job.get("context", ""), "target_round": rounds}
+    checkpoint = Checkpoint.create(meta, args.checkpoint_dir, debate_id=job["id"])
+    checkpoint.record_turn("System", INIT_TEMPLATE.format(topic=job["topic"]))
+    return checkpoint, None
+
+
+async def play_debate(gateway, agents, analyst, topic, identities, rounds, record, checkpoint=None, state=None):
+    """
+    用给定的 Agent 跑完一场辩论，把全文、裁决、用量与耗时写入 record 并返回。
+    usage 中的 context_saved_tokens 为参考资料打包后相对整段注入少发送的输入 token (估算)。
+    checkpoint: 每轮发言 / 评分 / 裁决追加写入的存档；state: 从存档读出的已有进度，已生成的发言不再请求。
+    """
+    started = time.perf_counter()
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "context_saved_tokens": 0}
+
+    def add_usage(u):
+        if u is not None:
+            usage["prompt_tokens"] += u.prompt_tokens
+            usage["completion_tokens"] += u.completion_tokens
+
+    memory = DebateMemory()
+    memory.set_opening(INIT_TEMPLATE.format(topic=topic))
+    transcript = []
+    scoring = []  # [(side, 评分任务)]，与后续发言并行
+
+    def submit_score(turn, side, reply, previous, saved=None):
+        if saved is not None:
+            task = asyncio.create_task(asyncio.sleep(0, result=(saved, None)))
+        else:
+            task = asyncio.create_task(ascore_turn(gateway, analyst, topic, side, identities[side], reply, previous))
+            if checkpoint is not None:
+                def save(t):
+                    if not t.cancelled() and t.exception() is None:
+                        checkpoint.record_score(turn, side, t.result()[0])
+
+                task.add_done_callback(save)
+        scoring.append((side, task))
+
+    try:
+        # 续跑：存档里的发言直接进入上下文，缺失的评分补评
+        for turn in state.debater_turns() if state is not None else []:
+            side, reply = turn["speaker"], turn["content"]
+            memory.add_turn(side, reply)
+            previous = transcript[-1]["content"] if transcript else None
+            transcript.append({"round": len(transcript) + 1, "speaker": side, "content": reply})
+            submit_score(len(scoring), side, reply, previous, state.scores.get(len(scoring)))
+
+        for round_index in range(len(transcript), rounds):
+            side = "Pro" if round_index % 2 == 0 else "Con"
+            agent = agents[side]
+            messages = agent.build_messages(memory.messages_for(side))
+            reply, u = await gateway.acomplete(messages, model=agent.config["model"], label=agent.name, **agent.sampling())
+            add_usage(u)
+            if agent.context is not None:
+                usage["context_saved_tokens"] += agent.context.saved_tokens
+            reply = agent.finish_turn(reply) or "（沉默）"
+            memory.add_turn(side, reply)
+            if checkpoint is not None:
+                checkpoint.record_turn(side, reply, round_index + 1)
+            previous = transcript[-1]["content"] if transcript else None
+            transcript.append({"round": round_index + 1, "speaker": side, "content": reply})
+            submit_score(round_index, side, reply, previous)
+
+        scored = []
+        for side, task in scoring:
+            try:
+                score, u = await task
+                add_usage(u)
+            except Exception:
+                score = None
+            scored.append((side, score))
+        for turn, (_, score) in zip(transcript, scored):
+            turn["score"] = score
+        record["verdict"] = aggregate(scored)
+        if checkpoint is not None:
+            checkpoint.record_verdict(record["verdict"])
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        for _, task in scoring:
+            task.cancel()
+    record["transcript"] = transcript
+    record["usage"] = usage
+    record["elapsed"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def load_jobs(path, skip_ids=()):
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            job.setdefault("id", str(line_no))
+            if job["id"] not in skip_ids:
+                jobs.append(job)
+    return jobs
+
+
+def finished_ids(path):
+    """--resume：读取输出文件中已成功完成的场次 id"""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in record:
+                done.add(record["id"])
+    return done
+
+
+async def run_batch(jobs, args, out):
+    gateway = get_gateway(
+        args.api_key, args.base_url, tenant="batch", kind="batch", max_concurrency=args.concurrency, rps=args.rps,
+        policy=RetryPolicy(timeout=args.timeout, max_retries=args.retries),
+    )
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def guarded(job):
+        async with slots:
+            return await run_debate(job, gateway, args)
+
+    tasks = [asyncio.create_task(guarded(job)) for job in jobs]
+    failed = 0
+    for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+        record = await task
+        failed += "error" in record
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        print(f"[{done}/{len(jobs)}] {record['id']} {record.get('error', 'ok')} ({record['elapsed']}s)", file=sys.stderr)
+    await gateway.aclose()
+    return failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量并发运行 AI 辩论并输出裁判评分")
+    parser.add_argument("input", help="议题 JSONL：每行包含 topic，可选 id / pro / con / rounds / context")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="结果 JSONL 输出路径")
+    parser.add_argument("--api-key", default=os.environ.get("DEEPSEEK_API_KEY", ""))
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--rounds", type=int, default=6, help="每场发言总次数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的辩论场数")
+    parser.add_argument("--rps", type=float, default=4.0, help="全局每秒请求数上限")
+    parser.add_argument("--retries", type=int, default=4, help="单次调用的最大重试次数")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单次调用超时 (秒)")
+    parser.add_argument("--resume", action="store_true", help="跳过输出文件中已成功完成的场次并追加写入")
+    parser.add_argument("--checkpoint-dir", default=None, help="逐轮存档目录；配合 --resume 可从中断的那一轮继续")
+    parser.add_argument("--chart", default=None, help="结束后把所有场次的得分画成一张对比雷达图 (SVG 路径)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.api_key:
+        sys.exit("请通过 --api-key 或环境变量 DEEPSEEK_API_KEY 提供 API Key")
+    skip = finished_ids(args.output) if args.resume else set()
+    jobs = load_jobs(args.input, skip)
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as out:
+        failed = asyncio.run(run_batch(jobs, args, out))
+    print(f"完成 {len(jobs)} 场，失败 {failed} 场 -> {args.output}", file=sys.stderr)
+    if args.chart:
+        from debate_core import CATEGORIES
+        from radar_chart import compare_svg
+
+        with open(args.output, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        with open(args.chart, "w", encoding="utf-8") as f:
+            f.write(compare_svg(records, CATEGORIES))
+        print(f"对比雷达图 -> {args.chart}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# ==========================================
+# 离线基准测试 (本地模拟服务，不消耗 API 额度)
+# ==========================================
+# 启动 mock_server.py 后，按固定场景驱动各条主流程，输出可跨提交比较的 JSON：
+#   turns / turns_concurrent   app.py 的回合逻辑 (增量上下文 + RAG + 流式生成 + 逐轮评分)，单会话 / 多会话并发
+#   v1 / v2                    debate_v1_basic.py / debate_v2_tools.py 的 AutoGen 流程 (v2 使用本地离线搜索语料)
+#   pdf_small / pdf_large      PDF 解析 (冷启动与磁盘缓存命中)
+#   startup                    新进程中 app.py 首次运行 (首屏) 与再次运行的耗时，以及首屏已加载的重型模块
+#   serving                    多个会话经 serving.py 排队服务发言，同时有大批后台评分任务涌入时的发言尾延迟
+# 每个场景在独立子进程中运行，峰值内存 (peak RSS) 互不干扰。用法：
+#   python benchmark.py -o bench.json
+#   python benchmark.py --scenarios turns,pdf_large --latency 0.5 --token-rate 30 --failure-rate 0.05
+#   python benchmark.py --scenarios turns --ramble-tokens 80   模型在核心论点后继续写下一轮 (衡量提前结束)
+
+SCENARIOS = {
+    "turns": {"kind": "turns", "rounds": 6, "sessions": 1},
+    "turns_concurrent": {"kind": "turns", "rounds": 6, "sessions": 8},
+    "v1": {"kind": "v1", "max_auto_reply": 4, "runs": 2},
+    "v2": {"kind": "v2", "max_round": 7, "runs": 2},
+    "pdf_small": {"kind": "pdf", "pages": 8, "runs": 3},
+    "pdf_large": {"kind": "pdf", "pages": 120, "runs": 3},
+    "startup": {"kind": "startup", "runs": 5},
+    "serving": {"kind": "serving", "sessions": 8, "turns": 6, "batch_jobs": 64, "workers": 8, "reserve": 2},
+}
+HEAVY_MODULES = ("openai", "autogen", "matplotlib.pyplot", "numpy", "PyPDF2")
+
+# 在全新解释器中用 Streamlit AppTest 跑一次 app.py：首次运行即新会话的首屏
+STARTUP_PROBE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120).run()
+t1 = time.perf_counter()
+at.run()
+t2 = time.perf_counter()
+print(json.dumps({{"first_run": t1 - t0, "rerun": t2 - t1, "ok": not at.exception,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+DOC_SENTENCE = "Section {page}.{line}: enterprise adoption, developer productivity and runtime cost trade-offs."
+
+
+def percentiles(samples):
+    from metrics import quantile
+
+    if not samples:
+        return {"count": 0}
+    return {"count": len(samples), "mean": round(sum(samples) / len(samples), 4),
+            **{f"p{int(q * 100)}": round(quantile(samples, q), 4) for q in (0.5, 0.9, 0.95, 0.99)},
+            "max": round(max(samples), 4)}
+
+
+def peak_rss_mb(children=False):
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 计，macOS 以字节计
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def synthetic_pages(count, lines=30):
+    return ["\n".join(DOC_SENTENCE.format(page=p, line=i) for i in range(lines)) for p in range(count)]
+
+
+def synthetic_pdf(pages):
+    """用 matplotlib 生成一份纯文本的多页 PDF"""
+    import io
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    buffer = io.BytesIO()
+    with PdfPages(buffer) as pdf:
+        for text in synthetic_pages(pages):
+            fig = plt.figure(figsize=(8.27, 11.69))
+            fig.text(0.05, 0.95, text, va="top", fontsize=7, family="monospace")
+            pdf.savefig(fig)
+            plt.close(fig)
+    return buffer.getvalue()
+
+
+def llm_summary(labels):
+    """从 METRICS 取出指定调用方的首 token 延迟、失败、取消、重试、提前结束次数与输出 token"""
+    from metrics import METRICS
+
+    records = [r for r in METRICS.trace if r["kind"] == "llm" and r["label"] in labels]
+    return {
+        "ttft": percentiles([r["ttft"] for r in records if not r["cache_hit"] and not r["cancelled"]]),
+        "calls": len(records),
+        "errors": sum(r["error"] is not None for r in records),
+        "cancelled": sum(r["cancelled"] for r in records),
+        "retries": sum(r["retries"] for r in records),
+        "early_stops": sum(r["early_stop"] for r in records),
+        "completion_tokens": sum(r["completion_tokens"] for r in records),
+    }
+
+
+# --- 场景 (在子进程中执行) ---
+def bench_turns(rounds, sessions):
+    from autoplay import AutoDebate
+    from debate_core import INIT_TEMPLATE, create_agents
+    from debate_memory import DebateMemory
+    from judge import IncrementalJudge
+    from metrics import METRICS
+    from retrieval import build_index, format_passages
+    from transcript_store import Transcript, TranscriptStore
+
+    api_key = os.environ["DEEPSEEK_API_KEY"]
+    topic = "2025年，全栈工程师会被 AI 取代吗？"
+    pages = synthetic_pages(40)
+    context = "\n".join(pages[:2])
+    index = build_index(pages)
+    store = TranscriptStore()
+    pro, con, analyst = create_agents(api_key, context, "资深技术架构师", "AI 安全伦理专家")
+
+    runners = []
+    for _ in range(sessions):
+        init_msg = INIT_TEMPLATE.format(topic=topic)
+        transcript = Transcript(store)
+        transcript.append("System", init_msg)
+        memory = DebateMemory()
+        memory.set_opening(init_msg)
+        judge = IncrementalJudge(topic, "资深技术架构师", "AI 安全伦理专家")
+        runners.append(AutoDebate(
+            {"Pro": pro, "Con": con}, analyst, transcript, memory, judge, topic,
+            {"Pro": "资深技术架构师", "Con": "AI 安全伦理专家"}, 0, rounds,
+            retrieve=lambda q: format_passages(index.search(q, k=4)),
+        ))
+
+    started = time.perf_counter()
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        while not runner.finished:
+            runner.wait(timeout=1.0)
+    wall = time.perf_counter() - started
+
+    turns = [r for r in METRICS.trace if r["kind"] == "llm" and r["label"] in ("Pro", "Con")]
+    completed = sum(r.round for r in runners)
+    return {
+        "wall": round(wall, 4),
+        "turn_latency": percentiles([r["latency"] for r in turns]),
+        "throughput_turns_per_s": round(completed / wall, 3),
+        "completed_turns": completed,
+        "failed_sessions": sum(r.error is not None for r in runners),
+        "debaters": llm_summary(("Pro", "Con")),
+        "judge": llm_summary(("judge",)),
+    }
+
+
+def _bench_autogen(main, runs, **kwargs):
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        try:
+            main(**kwargs)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - started
+    return {
+        "wall": round(wall, 4),
+        "debate_latency": percentiles(latencies),
+        "throughput_debates_per_s": round(runs / wall, 3),
+        "errors": errors,
+    }
+
+
+def bench_v1(max_auto_reply, runs):
+    import debate_v1_basic
+
+    return _bench_autogen(debate_v1_basic.main, runs, max_auto_reply=max_auto_reply)
+
+
+def bench_v2(max_round, runs):
+    import debate_v2_tools
+
+    return _bench_autogen(debate_v2_tools.main, runs, max_round=max_round)
+
+
+def bench_pdf(pages, runs):
+    from pdf_cache import evict, extract_pages
+
+    data = synthetic_pdf(pages)
+    cold, warm = [], []
+    for _ in range(runs):
+        evict(0)  # 清空磁盘缓存，测冷启动解析
+        t0 = time.perf_counter()
+        parsed = extract_pages(data)
+        cold.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        extract_pages(data)
+        warm.append(time.perf_counter() - t0)
+    total = sum(cold)
+    return {
+        "pages": len(parsed),
+        "bytes": len(data),
+        "cold": percentiles(cold),
+        "warm": percentiles(warm),
+        "throughput_pages_per_s": round(pages * runs / total, 2) if total else None,
+    }
+
+
+def bench_startup(runs):
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    probe = STARTUP_PROBE.format(app=app, heavy=HEAVY_MODULES)
+    first, rerun, heavy, failures = [], [], set(), 0
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True)
+        try:
+            sample = json.loads(proc.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            failures += 1
+            continue
+        first.append(sample["first_run"])
+        rerun.append(sample["rerun"])
+        heavy.update(sample["heavy"])
+        failures += not sample["ok"]
+    return {
+        "first_run": percentiles(first),
+        "rerun": percentiles(rerun),
+        "heavy_modules_at_first_paint": sorted(heavy),
+        "failures": failures,
+        "probe_peak_rss_mb": peak_rss_mb(children=True),
+    }
+
+
+def bench_serving(sessions, turns, batch_jobs, workers, reserve):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from llm_gateway import LLMGateway, TaggedGateway, get_gateway
+    from metrics import METRICS
+    from serving import Scheduler, ServingService, start_serving
+
+    api_key = os.environ["DEEPSEEK_API_KEY"]
+    service = ServingService(Scheduler(background_slots=workers - reserve), workers=workers).start()
+    server, url = start_serving(service=service)
+    # 批量任务模拟独立进程里的 batch_runner：单独的网关与并发上限
+    batch = TaggedGateway(LLMGateway(api_key, url, max_concurrency=batch_jobs), tenant="batch", kind="batch")
+
+    def judge_job(i):
+        batch.complete([{"role": "user", "content": f"评分任务 {i}"}], label="judge")
+
+    def session(i):
+        # 每个会话一个租户，共用进程内同一个网关逐轮流式发言 (与 app.py 相同的路径)
+        gateway = get_gateway(api_key, url, tenant=f"s{i}")
+        for turn in range(turns):
+            "".join(gateway.stream([{"role": "user", "content": f"会话 {i} 第 {turn} 轮"}], label="Pro"))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=batch_jobs + sessions) as pool:
+        jobs = [pool.submit(judge_job, i) for i in range(batch_jobs)]  # 后台任务先涌入，占满队列
+        time.sleep(0.05)
+        jobs += [pool.submit(session, i) for i in range(sessions)]
+        errors = sum(job.exception() is not None for job in jobs)
+    wall = time.perf_counter() - started
+    stats = service.scheduler.stats()
+    server.shutdown()
+
+    records = [r for r in METRICS.trace if r["kind"] == "llm"]
+    return {
+        "wall": round(wall, 4),
+        "turn_latency": percentiles([r["latency"] for r in records if r["label"] == "Pro"]),
+        "turn_ttft": percentiles([r["ttft"] for r in records if r["label"] == "Pro"]),
+        "batch_latency": percentiles([r["latency"] for r in records if r["label"] == "judge"]),
+        "queue_wait": stats["queue_wait"],
+        "errors": errors,
+    }
+
+
+BENCHES = {"turns": bench_turns, "v1": bench_v1, "v2": bench_v2, "pdf": bench_pdf, "startup": bench_startup,
+           "serving": bench_serving}
+
+
+def run_child(name, result_path):
+    params = dict(SCENARIOS[name])
+    bench = BENCHES[params.pop("kind")]
+    result = {"params": params}
+    try:
+        result.update(bench(**params))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["peak_rss_mb"] = peak_rss_mb()
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+# --- 主进程：启动模拟服务并逐个场景运行子进程 ---
+def write_corpus(path):
+    with open(path, "w", encoding="utf-8") as f:
+        for i, text in enumerate(synthetic_pages(50, lines=3)):
+            f.write(json.dumps({"title": f"Doc {i}", "href": f"https://example.com/{i}", "body": text}) + "\n")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    from mock_server import MockConfig, start_mock_server
+
+    parser = argparse.ArgumentParser(description="离线基准测试 (本地模拟 DeepSeek 服务)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗号分隔，可选：{', '.join(SCENARIOS)}")
+    parser.add_argument("-o", "--output", default=None, help="结果 JSON 路径 (默认输出到标准输出)")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--ramble-tokens", type=int, default=0, help="模拟模型在核心论点后继续写下一轮的 token 数")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--child", nargs=2, metavar=("SCENARIO", "RESULT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景：{unknown}")
+
+    config = MockConfig(args.latency, args.jitter, args.token_rate, args.reply_tokens, args.failure_rate, args.seed,
+                        args.ramble_tokens)
+    server, base_url = start_mock_server(config=config)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mock": config.as_dict(),
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="debate-bench-") as workdir:
+        corpus = os.path.join(workdir, "corpus.jsonl")
+        write_corpus(corpus)
+        for name in names:
+            result_path = os.path.join(workdir, f"{name}.json")
+            env = dict(
+                os.environ,
+                DEEPSEEK_BASE_URL=base_url,
+                DEEPSEEK_API_KEY="sk-bench",
+                DEBATE_CACHE_DIR=os.path.join(workdir, name),   # 每个场景独立的缓存目录
+                DEBATE_LLM_CACHE="off",                          # 测的是真实调用路径，不走响应缓存
+                DEBATE_SEARCH_BACKEND="local",
+                DEBATE_SEARCH_CORPUS=corpus,
+            )
+            env.pop("DEBATE_TRACE_PATH", None)
+            print(f"[bench] {name} ...", file=sys.stderr)
+            before = dict(config.stats)
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, result_path],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            try:
+                with open(result_path, encoding="utf-8") as f:
+                    result = json.load(f)
+            except FileNotFoundError:
+                result = {"error": f"子进程退出码 {proc.returncode}：{proc.stderr[-500:]}"}
+            result["mock_requests"] = {k: config.stats[k] - before[k] for k in config.stats}
+            report["scenarios"][name] = result
+    server.shutdown()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from response_cache import CACHE_DIR
+
+# ==========================================
+# 辩论存档 (逐轮追加的 JSONL 检查点) 与无 LLM 回放
+# ==========================================
+# 每场辩论一个文件，首行是带版本号的元信息，之后每发生一件事追加一行：
+#   {"v":1,"kind":"start","id":...,"meta":{topic, pro, con, context, target_round, source}}
+#   {"kind":"turn","seq":1,"speaker":"Pro","content":"...","round":1}     发言 / 锦囊 / 开场
+#   {"kind":"score","turn":0,"speaker":"Pro","score":{...}}                逐轮评分 (turn 为第几次辩手发言)
+#   {"kind":"verdict","verdict":{...}}                                     最终裁决
+# 只追加、每行 flush + fsync，进程崩溃最多丢掉正在写的那一行 (读取时跳过)；
+# app.py、batch_runner.py 与 AutoGen 脚本都能从中断处继续，已生成的发言不必重新付费生成。
+# 回放：python checkpoint.py show <id>    重新渲染全文
+#       python checkpoint.py verdict <id> 用存档里的逐轮评分重新汇总裁决 (不调用 LLM)
+
+CHECKPOINT_DIR = os.environ.get("DEBATE_CHECKPOINT_DIR", os.path.join(CACHE_DIR, "checkpoints"))
+FORMAT_VERSION = 1
+DEBATER_TAGS = ("Pro", "Con")
+AUTOGEN_KEYS = ("content", "role", "name", "function_call", "tool_calls", "tool_call_id")
+RESUMABLE_META = ("topic", "pro", "con")  # app.py 续辩 / 回放需要的元信息 (AutoGen 脚本的存档没有正反方身份)
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+class Checkpoint:
+    """一场辩论的存档文件 (只追加)，多个线程 (发言 / 后台评分) 可同时写入"""
+
+    def __init__(self, path):
+        self.path = path
+        self.id = os.path.splitext(os.path.basename(path))[0]
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._file = None
+        self.closed = False
+
+    @classmethod
+    def create(cls, meta, directory=CHECKPOINT_DIR, debate_id=None):
+        """新建存档并写入元信息行；debate_id 缺省时按时间生成 (便于按时间排序)"""
+        os.makedirs(directory, exist_ok=True)
+        debate_id = debate_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        checkpoint = cls(os.path.join(directory, f"{debate_id}.jsonl"))
+        checkpoint._file = open(checkpoint.path, "w", encoding="utf-8")  # 同名旧存档 (重新开跑) 直接覆盖
+        checkpoint._write({"v": FORMAT_VERSION, "kind": "start", "id": debate_id, "created": time.time(), "meta": meta})
+        return checkpoint
+
+    @classmethod
+    def reopen(cls, state):
+        """在已有存档后继续追加 (恢复续辩时使用)；先截掉崩溃时写了一半的末行"""
+        with open(state.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+        checkpoint = cls(state.path)
+        checkpoint._seq = state.next_seq
+        return checkpoint
+
+    def _write(self, record):
+        with self._lock:
+            if self.closed:
+                # 关闭后迟到的写入 (后台评分、重复裁决) 单独打开一次，不再常驻文件句柄
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(_dumps(record) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                return
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(_dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    # --- 写入 ---
+    def record_turn(self, speaker, content, round=None, message=None):
+        """message: AutoGen 脚本的原始消息 dict (恢复群聊时需要 name / role / function_call)"""
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+        record = {"kind": "turn", "seq": seq, "speaker": speaker, "content": content}
+        if round is not None:
+            record["round"] = round
+        if message is not None:
+            record["message"] = message
+        self._write(record)
+
+    def record_score(self, turn, speaker, score):
+        self._write({"kind": "score", "turn": turn, "speaker": speaker, "score": score})
+
+    def record_verdict(self, verdict):
+        self._write({"kind": "verdict", "verdict": verdict})
+
+    def close(self):
+        """释放文件句柄；之后的写入仍会追加到存档，但每次写完即关闭"""
+        with self._lock:
+            self.closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class DebateState:
+    """从存档读出的一场辩论：meta、按顺序的发言、逐轮评分与裁决"""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.id = header["id"]
+        self.created = header.get("created")
+        self.meta = header.get("meta", {})
+        self.turns = []         # [{"seq", "speaker", "content", "round"?, "message"?}]
+        self.scores = {}        # 第几次辩手发言 -> 评分
+        self.verdict = None
+
+    @property
+    def next_seq(self):
+        return self.turns[-1]["seq"] + 1 if self.turns else 0
+
+    def debater_turns(self):
+        return [t for t in self.turns if t["speaker"] in DEBATER_TAGS]
+
+    @property
+    def round_index(self):
+        """已完成的辩手发言数"""
+        return len(self.debater_turns())
+
+    def scored(self):
+        """[(side, score 或 None)]，与辩手发言一一对应；缺失的评分为 None"""
+        return [(t["speaker"], self.scores.get(i)) for i, t in enumerate(self.debater_turns())]
+
+    def messages(self):
+        """转成 transcript_store.Message，可直接交给 DebateMemory.from_history 重建上下文"""
+        from transcript_store import Message
+
+        return [Message(t["seq"], t["speaker"], t["content"], t.get("round")) for t in self.turns]
+
+    def rescore(self):
+        """只用存档里的逐轮评分重新汇总裁决，不调用 LLM"""
+        from judge import aggregate
+
+        return aggregate(self.scored())
+
+
+def load_checkpoint(path):
+    """读取存档；版本不符时抛 ValueError，末尾不完整的行 (写入时崩溃) 直接忽略"""
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    records = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    if not records or records[0].get("kind") != "start":
+        raise ValueError(f"不是辩论存档：{path}")
+    if records[0].get("v") != FORMAT_VERSION:
+        raise ValueError(f"不支持的存档版本 {records[0].get('v')} (当前 {FORMAT_VERSION})：{path}")
+
+    state = DebateState(path, records[0])
+    for record in records[1:]:
+        kind = record.get("kind")
+        if kind == "turn":
+            state.turns.append(record)
+        elif kind == "score":
+            state.scores[record["turn"]] = record["score"]
+        elif kind == "verdict":
+            state.verdict = record["verdict"]
+    return state
+
+
+def checkpoint_path(debate_id, directory=CHECKPOINT_DIR):
+    """接受存档 id 或文件路径"""
+    if os.path.exists(debate_id):
+        return debate_id
+    return os.path.join(directory, f"{debate_id}.jsonl")
+
+
+def resumable(state):
+    """存档是否带有正反方身份，可以在 app.py 中续辩 / 回放"""
+    return all(state.meta.get(key) for key in RESUMABLE_META)
+
+
+def list_checkpoints(directory=CHECKPOINT_DIR, limit=20, where=None):
+    """最近的存档，按修改时间倒序：[DebateState]；损坏或版本不符的文件跳过，where 为额外的过滤条件"""
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".jsonl")]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    states = []
+    for path in paths:
+        try:
+            states.append(load_checkpoint(path))
+        except (OSError, ValueError):
+            continue
+        if where is not None and not where(states[-1]):
+            states.pop()
+            continue
+        if len(states) >= limit:
+            break
+    return states
+
+
+def attach_autogen(checkpoint, agents, skip=0):
+    """
+    给 AutoGen 智能体挂上存档钩子：每条发出的消息追加一行。
+    skip: 恢复续辩时重新发出的消息条数 (已在存档里，不重复记录)。
+    """
+    from autogen.code_utils import content_str
+
+    pending = [skip]
+
+    def record(sender, message, recipient, silent):
+        if pending[0] > 0:
+            pending[0] -= 1
+            return message
+        msg = {"content": message} if isinstance(message, str) else {
+            k: message[k] for k in AUTOGEN_KEYS if message.get(k) is not None
+        }
+        content = content_str(msg.get("content"))
+        msg["content"] = content
+        msg.setdefault("role", "user")
+        if msg["role"] != "function":
+            msg["name"] = sender.name
+        msg["to"] = recipient.name
+        checkpoint.record_turn(sender.name, content, message=msg)
+        return message
+
+    for agent in agents:
+        agent.register_hook("process_message_before_send", record)
+
+
+def autogen_messages(state, group=False):
+    """
+    存档中 AutoGen 脚本记录的原始消息 (按发送顺序)。
+    group=True 时整理成 GroupChatManager.resume 的格式：name 一律为发送方 (它要求都是群聊成员，
+    函数结果也记在执行方名下)。
+    """
+    messages = []
+    for turn in state.turns:
+        if "message" not in turn:
+            continue
+        msg = dict(turn["message"])
+        if group:
+            msg.pop("to", None)
+            msg["name"] = turn["speaker"]
+        messages.append(msg)
+    return messages
+
+
+def replay_autogen(agents, messages):
+    """
+    两人对话的续辩：把除最后一条外的消息静默重放进双方的历史 (不触发回复、不调用 LLM)，
+    返回 (发送方, 接收方, 最后一条消息)，由调用方用 initiate_chat(clear_history=False) 接着跑。
+    """
+    by_name = {agent.name: agent for agent in agents}
+
+    def strip(msg):
+        msg = dict(msg)
+        msg.pop("to", None)
+        if msg.get("role") != "function":
+            msg.pop("name", None)  # 函数结果消息的 name 是函数名，需保留
+        return msg
+
+    for msg in messages[:-1]:
+        by_name[msg["name"]].send(strip(msg), by_name[msg["to"]], request_reply=False, silent=True)
+    last = messages[-1]
+    return by_name[last["name"]], by_name[last["to"]], strip(last)
+
+
+def describe(state):
+    meta = state.meta
+    created = time.strftime("%m-%d %H:%M", time.localtime(state.created or 0))
+    title = meta.get("topic") or meta.get("source", "")
+    return f"{created} · {title[:24]} · {state.round_index} 轮{' · 已裁决' if state.verdict else ''}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="辩论存档：列出、回放全文、用已存评分重新裁决 (不调用 LLM)")
+    parser.add_argument("command", choices=("list", "show", "verdict"))
+    parser.add_argument("id", nargs="?", help="存档 id 或文件路径")
+    parser.add_argument("--dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--chart", default=None, help="verdict：同时把裁决画成雷达图 (SVG 路径)")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for state in list_checkpoints(args.dir):
+            print(f"{state.id}  {describe(state)}")
+        return 0
+    if not args.id:
+        parser.error("需要存档 id")
+    state = load_checkpoint(checkpoint_path(args.id, args.dir))
+    names = {"Pro": f"正方 ({state.meta.get('pro', 'Pro')})", "Con": f"反方 ({state.meta.get('con', 'Con')})"}
+
+    if args.command == "show":
+        debater_index = 0
+        for turn in state.turns:
+            label = names.get(turn["speaker"], turn["speaker"])
+            score = None
+            if turn["speaker"] in DEBATER_TAGS:
+                score = state.scores.get(debater_index)
+                debater_index += 1
+            suffix = f"  [评分 {'/'.join(str(score[c]) for c in ('Logic', 'Evidence', 'Expression'))}]" if score else ""
+            print(f"--- {label}{suffix}\n{turn['content']}\n")
+        return 0
+
+    verdict = state.rescore()
+    print(json.dumps(verdict, ensure_ascii=False, indent=2))
+    if verdict["Winner"] is None:
+        print(f"未决：{verdict['Comment']}", file=sys.stderr)
+    if args.chart:
+        from debate_core import CATEGORIES
+        from radar_chart import verdict_svg
+
+        with open(args.chart, "w", encoding="utf-8") as f:
+            f.write(verdict_svg(verdict, CATEGORIES, names["Pro"], names["Con"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import re
+from functools import lru_cache
+
+from debate_memory import estimate_tokens
+
+# ==========================================
+# 参考资料打包 (去重 + 压缩 + token 预算 + 稳定前缀)
+# ==========================================
+# 文档摘要或原文开头原本被整段塞进正反方各自的 System Prompt，且每轮都要重发一遍。
+# 这里先把资料拆成句子级片段，去掉格式噪声、重复与近似重复的句子，再按 token 预算截取，
+# 得到一块紧凑的参考资料；它作为对话的第一条消息由正反方共用，
+# 使每次请求都以完全相同的前缀开头，能命中服务端的前缀缓存 (DeepSeek 上下文硬盘缓存)。
+
+PACK_HEADER = "【核心参考资料】(正反方共用)：\n"
+HEADER_PATTERN = re.compile(r"^\s*【[^】]*参考资料[^】]*】[^：:\n]*[：:]\s*")
+SENTENCE_END = re.compile(r"(?<=[。！？!?])\s*")
+BULLET_PATTERN = re.compile(r"^\s*(?:[-*•·●▪]+|\d{1,2}[.、)）]|[（(]\d{1,2}[)）])\s*")
+NOISE_PATTERN = re.compile(r"^(?:第?\s*\d+\s*页?|page\s*\d+|[\W_]+)$", re.IGNORECASE)
+KEY_PATTERN = re.compile(r"[\W_]+")
+
+
+class PackedContext:
+    """打包结果。raw_tokens / packed_tokens 为单次请求携带的资料 token 数，saved_tokens 为每次请求节省的数量"""
+
+    __slots__ = ("text", "raw_tokens", "packed_tokens", "dropped", "messages")
+
+    def __init__(self, text, raw_tokens, packed_tokens, dropped):
+        self.text = text
+        self.raw_tokens = raw_tokens
+        self.packed_tokens = packed_tokens
+        self.dropped = dropped      # 因重复或超出预算被丢弃的片段数
+        self.messages = ({"role": "system", "content": text},) if text else ()
+
+    @property
+    def saved_tokens(self):
+        return max(0, self.raw_tokens - self.packed_tokens)
+
+
+def _segments(text):
+    for line in text.splitlines():
+        line = BULLET_PATTERN.sub("", line)
+        line = re.sub(r"\s+", " ", line).strip()
+        if not line or NOISE_PATTERN.match(line):
+            continue
+        for sentence in SENTENCE_END.split(line):
+            if sentence.strip():
+                yield sentence.strip()
+
+
+def _bigrams(key):
+    return {key[i:i + 2] for i in range(len(key) - 1)} or {key}
+
+
+def _is_duplicate(key, grams, kept, threshold):
+    for other_key, other_grams in kept:
+        if key in other_key:
+            return True
+        if len(grams & other_grams) / len(grams | other_grams) >= threshold:
+            return True
+    return False
+
+
+@lru_cache(maxsize=64)
+def pack_context(text, budget_tokens=800, similarity=0.8):
+    """
+    把参考资料压缩成不超过 budget_tokens 的共享块。
+    保持原有顺序 (摘要里靠前的通常更重要)；与已保留句子完全相同、被其包含或字符二元组
+    Jaccard 相似度 >= similarity 的句子视为重复。结果按输入缓存，同一份资料只打包一次。
+    """
+    text = HEADER_PATTERN.sub("", text or "")
+    if not text.strip():
+        return PackedContext("", 0, 0, 0)
+    raw_tokens = estimate_tokens("【核心参考资料】：\n" + text)  # 对照：原先整段注入的写法
+
+    kept = []
+    lines = []
+    used = estimate_tokens(PACK_HEADER)
+    dropped = 0
+    for sentence in _segments(text):
+        key = KEY_PATTERN.sub("", sentence.lower())
+        if len(key) < 4:
+            dropped += 1
+            continue
+        grams = _bigrams(key)
+        if _is_duplicate(key, grams, kept, similarity):
+            dropped += 1
+            continue
+        tokens = estimate_tokens(sentence)
+        if used + tokens > budget_tokens:
+            dropped += 1
+            continue
+        kept.append((key, grams))
+        lines.append(sentence)
+        used += tokens
+
+    packed = PACK_HEADER + "\n".join(lines) if lines else ""
+    return PackedContext(packed, raw_tokens, estimate_tokens(packed) if packed else 0, dropped)
@@ -0,0 +1,138 @@
+from context_pack import pack_context
+from llm_gateway import BASE_URL, MODEL, gateway_for, sampling_params
+from turn_control import ADAPTIVE, BUDGETS, TURN_STOPS, TurnCutter, trim_turn
+
+# ==========================================
+# 辩论核心配置 (人设 Prompt / Agent / 裁判)
+# ==========================================
+# 不依赖 Streamlit，app.py、批量运行器等入口共用同一套人设与 Prompt 逻辑。
+
+INIT_TEMPLATE = "议题：‘{topic}’。请正方发言，反方反驳。"
+JUDGE_SYSTEM = "Strict judge. Output JSON ONLY."
+CATEGORIES = ["Logic", "Evidence", "Expression"]
+CONTEXT_NOTE = "见对话开头的【核心参考资料】"
+
+STOP_PROMPT = """
+    【CRITICAL RULES】:
+    1. DO NOT repeat the user's input or the opponent's argument.
+    2. Start your argument DIRECTLY.
+    3. ONLY generate ONE single turn.
+    4. Speak in Chinese.
+    5. At the very end, append a new line with a concise summary: '【核心论点】：<your core argument in one sentence>'.
+    """
+
+
+def debater_config(api_key, tenant=None):
+    return {
+        "model": MODEL,
+        "api_key": api_key,
+        "base_url": BASE_URL,
+        "api_type": "openai",
+        "temperature": 0.7,
+        "max_tokens": 500, # 上限；实际按人设近期发言长度自适应 (见 turn_control.py)
+        "frequency_penalty": 0.6,
+        "presence_penalty": 0.6,
+        "stop": TURN_STOPS,  # 替对方写出下一轮时立即停止
+        "tenant": tenant,  # 排队服务中的租户 (见 serving.py)，不会作为采样参数发送
+    }
+
+
+def analyst_config(api_key, tenant=None):
+    return {
+        "model": MODEL,
+        "api_key": api_key,
+        "base_url": BASE_URL,
+        "api_type": "openai",
+        "temperature": 0.5,
+        "max_tokens": 600,
+        "response_format": {"type": "json_object"}, # JSON 模式，减少解析失败
+        "tenant": tenant,
+    }
+
+
+def build_system_prompt(side, identity, context_text):
+    """side 为 "Pro" 或 "Con"；将用户输入的身份注入到 System Prompt 中"""
+    side_name = "正方" if side == "Pro" else "反方"
+    return f"【角色设定】：你是{side_name}辩手，你的身份是【{identity}】。\n【参考资料】：{context_text}\n请完全沉浸在你的角色中，使用该角色特有的视角、专业术语和语气进行辩论。{STOP_PROMPT}"
+
+
+class DebateAgent:
+    """
+    轻量级 Agent：只保存人设与采样配置，真正的调用统一走共享的 LLM 网关。
+    context: 打包后的共享参考资料 (PackedContext)，作为固定前缀放在人设之前。
+    persona: 辩手的人设身份；设置后每轮发言在核心论点行写完时提前结束，max_tokens 按该人设的历史长度自适应。
+    """
+
+    def __init__(self, name, system_message, llm_config, context=None, persona=None):
+        self.name = name
+        self.system_message = system_message
+        self.llm_config = llm_config
+        self.context = context
+        self.persona = persona
+
+    @property
+    def config(self):
+        return self.llm_config["config_list"][0]
+
+    @property
+    def gateway(self):
+        return gateway_for(self.config)
+
+    def build_messages(self, messages):
+        prefix = self.context.messages if self.context is not None else ()
+        return [*prefix, {"role": "system", "content": self.system_message}] + list(messages)
+
+    def sampling(self):
+        """本轮的采样参数：辩手的 max_tokens 取该人设的自适应预算"""
+        params = sampling_params(self.config)
+        if self.persona is not None and ADAPTIVE and "max_tokens" in params:
+            params["max_tokens"] = BUDGETS.get(self.persona, params["max_tokens"]).max_tokens
+        return params
+
+    def cutter(self):
+        return TurnCutter() if self.persona is not None else None
+
+    def finish_turn(self, text, record=True):
+        """裁剪成单轮发言，返回裁剪后的文本；record 为 True 时记入该人设的长度统计"""
+        if self.persona is None:
+            return text
+        text = trim_turn(text)
+        if record:
+            self.record_turn(text)
+        return text
+
+    def record_turn(self, text):
+        """把一轮实际采用的发言记入该人设的长度统计 (被作废的预生成不记录)"""
+        if self.persona is not None:
+            BUDGETS.get(self.persona, self.config.get("max_tokens", 500)).observe(text)
+
+    def generate_reply(self, messages):
+        if self.persona is None:
+            text, _ = self.gateway.complete(self.build_messages(messages), model=self.config["model"], label=self.name, **self.sampling())
+            return text
+        # 辩手也走流式通道：核心论点写完即断开，预生成 (speculation) 同样受益
+        pieces = self.gateway.stream(self.build_messages(messages), model=self.config["model"], label=self.name,
+                                     cutter=self.cutter(), **self.sampling())
+        return self.finish_turn("".join(pieces))
+
+
+def create_agents(api_key, context_text, pro_identity, con_identity, tenant=None):
+    """
+    初始化 Agents，支持动态身份设定。
+    参数: context_text (参考资料原文或摘要), pro_identity (正方人设), con_identity (反方人设),
+    tenant (多用户部署时的租户 id，调用经排队服务按租户限速)
+    参考资料经去重压缩后作为正反方共用的前缀消息，人设 Prompt 中只保留指引。
+    """
+    base_config = [debater_config(api_key, tenant)]
+    context = pack_context(context_text)
+    note = CONTEXT_NOTE if context.text else ""
+    pro = DebateAgent("Pro", system_message=build_system_prompt("Pro", pro_identity, note), llm_config={"config_list": base_config}, context=context, persona=pro_identity)
+    con = DebateAgent("Con", system_message=build_system_prompt("Con", con_identity, note), llm_config={"config_list": base_config}, context=context, persona=con_identity)
+
+    analyst = DebateAgent(
+        "Analyst",
+        system_message=JUDGE_SYSTEM,
+        llm_config={"config_list": [analyst_config(api_key, tenant)]}
+    )
+
+    return pro, con, analyst
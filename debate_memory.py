@@ -0,0 +1,115 @@
+import re
+
+# ==========================================
+# 增量式辩论上下文 (按发言方维护消息日志)
+# ==========================================
+# 每位辩手各维护一份已做好角色映射的消息列表，新发言落地时只做追加；
+# 当上下文超过 token 预算时，把最早的发言折叠成「前情提要」，
+# 使每轮 prompt 的长度保持平稳，而不是随轮次线性增长。
+
+SPEAKERS = ("Pro", "Con")
+SPEAKER_NAMES = {"Pro": "正方", "Con": "反方"}
+CORE_PATTERN = re.compile(r"【核心论点】[:：]\s*(.+)")
+INSTRUCTION_SUFFIX = "\n(【强制】：只输出一轮发言，不要复述指令！)"
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中日韩字符约 1 个 token，其余约 4 个字符 1 个 token。"""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿" or "　" <= ch <= "〿" or "＀" <= ch <= "￯")
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def core_point(text, limit=80):
+    """提取一轮发言的核心论点；没有【核心论点】行时退化为截取开头。"""
+    match = CORE_PATTERN.search(text)
+    point = match.group(1) if match else text.strip().split("\n", 1)[0]
+    point = point.strip()
+    return point if len(point) <= limit else point[:limit] + "…"
+
+
+class DebateMemory:
+    """
+    增量维护 Pro/Con 两份消息日志。
+    参数: budget_tokens (单方上下文预算), keep_recent (始终保留原文的最近发言数)
+    """
+
+    def __init__(self, budget_tokens=3000, keep_recent=4):
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.opening = None
+        self.turns = []            # [(speaker, content, tokens)] 仍以原文形式保留的发言
+        self.summary_points = []   # 已折叠进前情提要的 "正方：xxx" 条目
+        self.summary_tokens = 0
+        self.turn_tokens = 0
+        self.pending_instruction = None
+        self._logs = {s: [] for s in SPEAKERS}
+
+    # --- 写入 ---
+    def set_opening(self, content):
+        self.opening = {"role": "user", "content": content}
+        self._rebuild_logs()
+
+    def add_instruction(self, content):
+        """锦囊只作用于下一轮发言，不写入长期日志。"""
+        self.pending_instruction = content
+
+    def add_turn(self, speaker, content):
+        tokens = estimate_tokens(content)
+        self.turns.append((speaker, content, tokens))
+        self.turn_tokens += tokens
+        self.pending_instruction = None
+        for s in SPEAKERS:
+            role = "assistant" if s == speaker else "user"
+            self._logs[s].append({"role": role, "content": content})
+        self._compact()
+
+    # --- 读取 ---
+    def messages_for(self, speaker):
+        """返回给 speaker 的消息列表 (已含前情提要与待执行的锦囊)。"""
+        messages = list(self._logs[speaker])
+        if self.pending_instruction:
+            messages.append({"role": "user", "content": f" {self.pending_instruction} {INSTRUCTION_SUFFIX}"})
+        return messages
+
+    def context_tokens(self):
+        return self.summary_tokens + self.turn_tokens
+
+    # --- 预算控制 ---
+    def _compact(self):
+        if self.context_tokens() <= self.budget_tokens or len(self.turns) <= self.keep_recent:
+            return
+        while self.context_tokens() > self.budget_tokens and len(self.turns) > self.keep_recent:
+            speaker, content, tokens = self.turns.pop(0)
+            self.turn_tokens -= tokens
+            point = f"{SPEAKER_NAMES.get(speaker, speaker)}：{core_point(content)}"
+            self.summary_points.append(point)
+            self.summary_tokens += estimate_tokens(point)
+        # 前情提要本身也有上限，最早的要点优先丢弃
+        summary_budget = self.budget_tokens // 4
+        while self.summary_tokens > summary_budget and len(self.summary_points) > 1:
+            self.summary_tokens -= estimate_tokens(self.summary_points.pop(0))
+        self._rebuild_logs()
+
+    def _rebuild_logs(self):
+        head = [self.opening] if self.opening else []
+        if self.summary_points:
+            recap = "【前情提要】：\n" + "\n".join(f"- {p}" for p in self.summary_points)
+            head.append({"role": "user", "content": recap})
+        for s in SPEAKERS:
+            self._logs[s] = head + [
+                {"role": "assistant" if s == speaker else "user", "content": content}
+                for speaker, content, _ in self.turns
+            ]
+
+    @classmethod
+    def from_history(cls, messages, **kwargs):
+        """由已有发言记录 (带 speaker / content 属性) 一次性重建，例如恢复会话时。"""
+        memory = cls(**kwargs)
+        for m in messages:
+            if m.speaker == "System":
+                memory.set_opening(m.content)
+            elif m.speaker == "Instruction":
+                memory.add_instruction(m.content)
+            elif m.speaker in SPEAKERS:
+                memory.add_turn(m.speaker, m.content)
+        return memory
@@ -1,67 +1,108 @@
+import argparse
+import os
+
 import autogen
+from checkpoint import Checkpoint, attach_autogen, autogen_messages, checkpoint_path, load_checkpoint, replay_autogen
+from llm_gateway import autogen_config_list
+from response_cache import autogen_cache
+
+TOPIC_MESSAGE = "今天的辩题是：‘在2025年，大学生应该首选 Java 还是 Python 作为第一语言？’ 请正方先阐述观点。"
 
-# 1. 配置 LLM (使用 DeepSeek)
-# AutoGen 兼容 OpenAI 格式，所以我们把 base_url 改成 DeepSeek 的地址即可
-config_list = [
-    {
-        "model": "deepseek-chat",  # 模型名称
-        "api_key": "",  # 【重要】在这里填入你的 Key
-        "base_url": "https://api.deepseek.com"       # DeepSeek 的 API 地址
+
+def build_agents(config_list, max_auto_reply=6):
+    """创建正方、反方与裁判三个智能体"""
+    # 通用的配置参数
+    llm_config = {
+        "config_list": config_list,
+        "temperature": 0.7,  # 0.7 比较有创造力，适合辩论
+        "timeout": 120,
+        "cache_seed": None,  # 缓存统一交给 autogen_cache()，关闭 AutoGen 自带的 cache_seed 磁盘缓存
     }
-]
 
-# 通用的配置参数
-llm_config = {
-    "config_list": config_list,
-    "temperature": 0.7,  # 0.7 比较有创造力，适合辩论
-    "timeout": 120,
-}
+    # 2. 定义【正方】智能体
+    # system_message 定义了它的“人设”
+    pro_agent = autogen.AssistantAgent(
+        name="Pro_Java",
+        system_message="""
+        你是正方辩手。你坚定地认为【Java 是最适合大型企业级开发的语言】。
+        你的辩论风格：逻辑严密，喜欢引用设计模式、强类型安全、JVM生态作为论据。
+        每次发言控制在 100 字以内，言辞犀利。
+        """,
+        llm_config=llm_config,
+    )
+
+    # 3. 定义【反方】智能体
+    con_agent = autogen.AssistantAgent(
+        name="Pro_Python",
+        system_message="""
+        你是反方辩手。你坚定地认为【Python 才是现代开发的王者，Java 已经过时了】。
+        你的辩论风格：激进，喜欢强调开发效率、AI/数据科学生态、语法简洁。
+        你可以嘲笑 Java 代码臃肿。
+        每次发言控制在 100 字以内。
+        """,
+        llm_config=llm_config,
+    )
+
+    # 4. 定义【裁判/管理员】智能体
+    # UserProxyAgent 通常作为人类代理，但这里我们把它设为自动模式，让它负责发起话题
+    judge = autogen.UserProxyAgent(
+        name="Judge_Moderator",
+        human_input_mode="NEVER",  # 设置为 NEVER 表示不需要你手动打字，全自动运行
+        max_consecutive_auto_reply=max_auto_reply,  # 让它们最多对战几个回合 (默认 6)，省钱
+        is_termination_msg=lambda x: "辩论结束" in (x.get("content") or ""),
+        code_execution_config=False,  # 关闭代码执行功能（我们只需要说话，不需要运行代码）
+        system_message="""
+        你是辩论赛主席。
+        你的任务是：
+        1. 观察双方辩论。
+        2. 每一轮都要确保话题不跑偏。
+        3. 当辩论进行几轮后，你可以说“辩论结束”来停止对话。
+        """,
+    )
+    return pro_agent, con_agent, judge
+
+
+def main(max_auto_reply=6, resume=None):
+    """resume: 存档 id 或路径；从中断处继续，已有发言不再重新生成"""
+    # 1. 配置 LLM (使用 DeepSeek)
+    # AutoGen 兼容 OpenAI 格式，统一由 llm_gateway 提供 DeepSeek 的模型名与 API 地址
+    # 【重要】通过环境变量 DEEPSEEK_API_KEY 填入你的 Key
+    config_list = autogen_config_list(os.environ.get("DEEPSEEK_API_KEY", ""))
+    pro_agent, con_agent, judge = build_agents(config_list, max_auto_reply)
 
-# 2. 定义【正方】智能体
-# system_message 定义了它的“人设”
-pro_agent = autogen.AssistantAgent(
-    name="Pro_Java",
-    system_message="""
-    你是正方辩手。你坚定地认为【Java 是最适合大型企业级开发的语言】。
-    你的辩论风格：逻辑严密，喜欢引用设计模式、强类型安全、JVM生态作为论据。
-    每次发言控制在 100 字以内，言辞犀利。
-    """,
-    llm_config=llm_config,
-)
+    # 每条消息发出时追加写入存档 (python checkpoint.py show <id> 可回放)
+    if resume:
+        state = load_checkpoint(checkpoint_path(resume))
+        messages = autogen_messages(state)
+        checkpoint = Checkpoint.reopen(state)
+        if messages:
+            sender, recipient, last_message = replay_autogen([judge, pro_agent], messages)
+            # 裁判已用掉的自动回复次数 (首条是开场白，不计)
+            used = max(0, sum(1 for m in messages if m["name"] == judge.name) - 1)
+            judge.update_max_consecutive_auto_reply(max(1, max_auto_reply - used))
+            attach_autogen(checkpoint, [judge, pro_agent], skip=1)  # 最后一条会被重新发出，已在存档里
+            print(f"======== 从存档 {checkpoint.id} 继续 (已有 {len(messages)} 条消息) ========")
+            return sender.initiate_chat(recipient, message=last_message, clear_history=False, cache=autogen_cache())
+        # 开场白写入前就中断了：存档里只有头部，在同一个存档上从头开始
+        print(f"存档 {checkpoint.id} 中还没有消息，从头开始")
+    else:
+        checkpoint = Checkpoint.create({"source": "v1_basic", "topic": TOPIC_MESSAGE})
+        print(f"存档：{checkpoint.id} (中断后可用 --resume {checkpoint.id} 继续)")
+    attach_autogen(checkpoint, [judge, pro_agent])
 
-# 3. 定义【反方】智能体
-con_agent = autogen.AssistantAgent(
-    name="Pro_Python",
-    system_message="""
-    你是反方辩手。你坚定地认为【Python 才是现代开发的王者，Java 已经过时了】。
-    你的辩论风格：激进，喜欢强调开发效率、AI/数据科学生态、语法简洁。
-    你可以嘲笑 Java 代码臃肿。
-    每次发言控制在 100 字以内。
-    """,
-    llm_config=llm_config,
-)
+    # 5. 开始辩论！
+    # 由裁判发起，让正方先说话
+    print("======== 辩论开始：Java vs Python ========")
+    return judge.initiate_chat(
+        pro_agent,  # 裁判先对正方说话
+        message=TOPIC_MESSAGE,
+        cache=autogen_cache(),  # SQLite 响应缓存：复现同一场辩论不再调用 API (DEBATE_LLM_CACHE=replay 可强制只读回放)
+    )
 
-# 4. 定义【裁判/管理员】智能体
-# UserProxyAgent 通常作为人类代理，但这里我们把它设为自动模式，让它负责发起话题
-judge = autogen.UserProxyAgent(
-    name="Judge_Moderator",
-    human_input_mode="NEVER",  # 设置为 NEVER 表示不需要你手动打字，全自动运行
-    max_consecutive_auto_reply=6,  # 让它们最多对战 6 回合，省钱
-    is_termination_msg=lambda x: "辩论结束" in x.get("content", ""),
-    code_execution_config=False,  # 关闭代码执行功能（我们只需要说话，不需要运行代码）
-    system_message="""
-    你是辩论赛主席。
-    你的任务是：
-    1. 观察双方辩论。
-    2. 每一轮都要确保话题不跑偏。
-    3. 当辩论进行几轮后，你可以说“辩论结束”来停止对话。
-    """,
-)
 
-# 5. 开始辩论！
-# 由裁判发起，让正方先说话
-print("======== 辩论开始：Java vs Python ========")
-judge.initiate_chat(
-    pro_agent,  # 裁判先对正方说话
-    message="今天的辩题是：‘在2025年，大学生应该首选 Java 还是 Python 作为第一语言？’ 请正方先阐述观点。",
-)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Java vs Python 双人辩论 (AutoGen)")
+    parser.add_argument("--resume", default=None, help="存档 id 或路径，从中断处继续")
+    parser.add_argument("--max-auto-reply", type=int, default=6)
+    args = parser.parse_args()
+    main(args.max_auto_reply, args.resume)
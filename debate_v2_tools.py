@@ -1,121 +1,184 @@
+import argparse
+import os
+
 import autogen
-from duckduckgo_search import DDGS
+from checkpoint import Checkpoint, attach_autogen, autogen_messages, checkpoint_path, load_checkpoint
+from llm_gateway import autogen_config_list
+from response_cache import autogen_cache
+from search_tools import format_results, get_search_service
+from speaker_selection import speaker_selection_method
 
 # ==========================================
 # 1. 定义工具函数
 # ==========================================
-def search_web(query: str) -> str:
-    print(f"\n[系统提示] 正在调用搜索工具，查询：{query} ...\n")
+# 搜索走 search_tools：规范化查询缓存 (内存 LRU + 磁盘) + 多查询并行 + 可切换后端
+def search_web(query: str = "", queries: list = None) -> str:
+    all_queries = [q for q in ([query] if query else []) + list(queries or []) if q.strip()]
+    if not all_queries:
+        return "未提供查询关键词。"
+    print(f"\n[系统提示] 正在调用搜索工具，查询：{all_queries} ...\n")
     try:
-        # 使用 DuckDuckGo 搜索
-        results = DDGS().text(query, max_results=3)
-        if not results:
-            return "未找到相关结果。"
-        summary = ""
-        for res in results:
-            summary += f"标题: {res['title']}\n链接: {res['href']}\n摘要: {res['body']}\n\n"
-        return summary
+        results = get_search_service().search_many(all_queries, max_results=3)
+        return "".join(format_results(q, results[q]) for q in all_queries)
     except Exception as e:
         return f"搜索出错: {str(e)}"
 
+
+TOPIC_MESSAGE = "今天的辩题是：‘2024-2025年，Java 和 Python 谁的市场需求更大？’ 请双方利用搜索工具查找最新数据进行辩论。"
+
+
 # ==========================================
 # 2. 配置两份 Config (修复报错的关键)
 # ==========================================
-config_list = [
-    {
-        "model": "deepseek-chat",
-        "api_key": "",  # 【请在此处填入你的 Key】
-        "base_url": "https://api.deepseek.com"
+def build_configs(config_list):
+    # 配置 A：给【管理员】用的 (干净，没有工具)
+    llm_config_manager = {
+        "config_list": config_list,
+        "temperature": 0.7,
+        "cache_seed": None,  # 缓存统一交给 autogen_cache()，关闭 AutoGen 自带的 cache_seed 磁盘缓存
     }
-]
-
-# 配置 A：给【管理员】用的 (干净，没有工具)
-llm_config_manager = {
-    "config_list": config_list,
-    "temperature": 0.7,
-}
-
-# 配置 B：给【辩手】用的 (带工具)
-llm_config_agents = {
-    "config_list": config_list,
-    "temperature": 0.5,
-    "timeout": 120,
-    "functions": [
-        {
-            "name": "search_web",
-            "description": "当需要查询实时数据、最新排名或具体事实时使用此工具。",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "搜索关键词",
-                    }
+
+    # 配置 B：给【辩手】用的 (带工具)
+    llm_config_agents = {
+        "config_list": config_list,
+        "temperature": 0.5,
+        "timeout": 120,
+        "cache_seed": None,
+        "functions": [
+            {
+                "name": "search_web",
+                "description": "当需要查询实时数据、最新排名或具体事实时使用此工具。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "搜索关键词",
+                        },
+                        "queries": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "需要同时查询多个关键词时使用，会并行搜索",
+                        },
+                    },
                 },
-                "required": ["query"],
-            },
-        }
-    ],
-}
+            }
+        ],
+    }
+    return llm_config_manager, llm_config_agents
+
 
 # ==========================================
 # 3. 定义角色
 # ==========================================
+def build_agents(llm_config_agents):
+    # 正方：Java (使用带工具的配置)
+    pro_agent = autogen.AssistantAgent(
+        name="Pro_Java",
+        system_message="""
+        你是正方辩手 (Java)。
+        【极重要规则】：
+        1. 你没有任何内部知识。所有数据必须通过 `search_web` 工具获取。
+        2. 每一轮发言前，**必须先调用工具**，拿到结果后再发言。
+        3. 不要输出 "(调用搜索工具...)" 这种文字，要真正的发送工具调用请求。
+        """,
+        llm_config=llm_config_agents,
+    )
 
-# 正方：Java (使用带工具的配置)
-pro_agent = autogen.AssistantAgent(
-    name="Pro_Java",
-    system_message="""
-    你是正方辩手 (Java)。
-    【极重要规则】：
-    1. 你没有任何内部知识。所有数据必须通过 `search_web` 工具获取。
-    2. 每一轮发言前，**必须先调用工具**，拿到结果后再发言。
-    3. 不要输出 "(调用搜索工具...)" 这种文字，要真正的发送工具调用请求。
-    """,
-    llm_config=llm_config_agents,
-)
-
-# 反方：Python (使用带工具的配置)
-con_agent = autogen.AssistantAgent(
-    name="Pro_Python",
-    system_message="""
-    你是反方辩手 (Python)。
-    【极重要规则】：
-    1. 每一轮发言前，**必须先调用 search_web 工具** 查找反驳证据。
-    2. 不要口头描述你在搜索，直接发起调用。
-    """,
-    llm_config=llm_config_agents,
-)
-
-# 裁判/执行者 (UserProxy)
-# 只有裁判有能力真正执行代码，所以要把 function_map 给他
-judge = autogen.UserProxyAgent(
-    name="Judge",
-    human_input_mode="NEVER",
-    code_execution_config=False,
-    function_map={"search_web": search_web}
-)
+    # 反方：Python (使用带工具的配置)
+    con_agent = autogen.AssistantAgent(
+        name="Pro_Python",
+        system_message="""
+        你是反方辩手 (Python)。
+        【极重要规则】：
+        1. 每一轮发言前，**必须先调用 search_web 工具** 查找反驳证据。
+        2. 不要口头描述你在搜索，直接发起调用。
+        """,
+        llm_config=llm_config_agents,
+    )
 
-# ==========================================
-# 4. 创建群聊
-# ==========================================
-groupchat = autogen.GroupChat(
-    agents=[judge, pro_agent, con_agent], 
-    messages=[], 
-    max_round=6
-)
-
-# 【核心修复】：Manager 使用不带工具的配置
-manager = autogen.GroupChatManager(
-    groupchat=groupchat, 
-    llm_config=llm_config_manager # <--- 注意这里用 manager 配置
-)
+    # 裁判/执行者 (UserProxy)
+    # 只有裁判有能力真正执行代码，所以要把 function_map 给他
+    judge = autogen.UserProxyAgent(
+        name="Judge",
+        human_input_mode="NEVER",
+        code_execution_config=False,
+        function_map={"search_web": search_web}
+    )
+    return pro_agent, con_agent, judge
 
-# ==========================================
-# 5. 开始运行
-# ==========================================
-print("======== 增强版辩论赛（带联网功能）开始 ========")
-judge.initiate_chat(
-    manager,
-    message="今天的辩题是：‘2024-2025年，Java 和 Python 谁的市场需求更大？’ 请双方利用搜索工具查找最新数据进行辩论。"
-)
\ No newline at end of file
+
+def main(max_round=6, resume=None):
+    """resume: 存档 id 或路径；从中断处继续，已有发言与搜索结果不再重新生成"""
+    # 【请通过环境变量 DEEPSEEK_API_KEY 填入你的 Key】
+    config_list = autogen_config_list(os.environ.get("DEEPSEEK_API_KEY", ""))
+    llm_config_manager, llm_config_agents = build_configs(config_list)
+    pro_agent, con_agent, judge = build_agents(llm_config_agents)
+
+    # ==========================================
+    # 4. 创建群聊
+    # ==========================================
+    participants = [judge, pro_agent, con_agent]
+    messages = []
+    if resume:
+        state = load_checkpoint(checkpoint_path(resume))
+        messages = autogen_messages(state, group=True)
+        if len(messages) >= max_round:
+            print(f"存档 {state.id} 已有 {len(messages)} 条消息，达到 max_round={max_round}，无需续跑")
+            return None
+
+    groupchat = autogen.GroupChat(
+        agents=[judge, pro_agent, con_agent], 
+        messages=[], 
+        # 续跑只给剩余轮数：resume 装回前 n-1 条，run_chat 第一轮重新追加最后一条，之后每轮生成一条，
+        # 总数与不中断时一致。必须在创建 Manager 之前设置 —— Manager 注册回复时保存的是 GroupChat 的浅拷贝，
+        # 之后再改 groupchat.max_round 不会生效
+        max_round=max_round - len(messages) + 1 if messages else max_round,
+        # 规则选人：正方→工具→正方发言→反方→工具… 不再每轮额外调用一次 LLM 选人
+        # (设置 DEBATE_SPEAKER_MODE=llm 可恢复 Manager 的 LLM 选人)
+        speaker_selection_method=speaker_selection_method(pro_agent, con_agent, judge),
+    )
+
+    # 【核心修复】：Manager 使用不带工具的配置 (仅 LLM 选人模式下会用到)
+    manager = autogen.GroupChatManager(
+        groupchat=groupchat, 
+        llm_config=llm_config_manager # <--- 注意这里用 manager 配置
+    )
+
+    # ==========================================
+    # 5. 开始运行 (每条消息追加写入存档，可中断后续跑)
+    # ==========================================
+    if resume and messages:
+        checkpoint = Checkpoint.reopen(state)
+        # resume 把历史消息装回群聊与各智能体，最后一条由其发送方重新发出
+        last_agent, last_message = manager.resume(messages=messages)
+        attach_autogen(checkpoint, participants, skip=1)
+        print(f"======== 从存档 {checkpoint.id} 继续 (已有 {len(messages)} 条消息) ========")
+        result = last_agent.initiate_chat(manager, message=last_message, clear_history=False, cache=autogen_cache())
+        # 校验：续跑后的消息总数不应超过不中断时的 max_round (多出的每条都是一次付费调用)
+        if len(groupchat.messages) > max_round:
+            print(f"⚠️ 续跑后共 {len(groupchat.messages)} 条消息，超过 max_round={max_round}")
+        return result
+
+    if resume:
+        # 开场白写入前就中断了：存档里只有头部，在同一个存档上从头开始
+        checkpoint = Checkpoint.reopen(state)
+        print(f"存档 {checkpoint.id} 中还没有消息，从头开始")
+    else:
+        checkpoint = Checkpoint.create({"source": "v2_tools", "topic": TOPIC_MESSAGE})
+        print(f"存档：{checkpoint.id} (中断后可用 --resume {checkpoint.id} 继续)")
+    attach_autogen(checkpoint, participants)
+    print("======== 增强版辩论赛（带联网功能）开始 ========")
+    return judge.initiate_chat(
+        manager,
+        message=TOPIC_MESSAGE,
+        cache=autogen_cache(),  # SQLite 响应缓存：复现同一场辩论不再调用 API
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="带联网搜索的群聊辩论 (AutoGen)")
+    parser.add_argument("--resume", default=None, help="存档 id 或路径，从中断处继续")
+    parser.add_argument("--max-round", type=int, default=6)
+    args = parser.parse_args()
+    main(args.max_round, args.resume)
@@ -0,0 +1,226 @@
+import json
+import re
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from debate_core import CATEGORIES
+from llm_gateway import sampling_params
+
+# ==========================================
+# 增量裁判 (逐轮评分 + 汇总裁决)
+# ==========================================
+# 每轮发言落地后立即在后台评分 (与下一位辩手的生成并行)，只看本轮与对手上一轮，
+# prompt 很短；最终裁决只汇总各轮得分，不再把整场辩论塞进一次长 prompt。
+# 评分走 JSON 模式 + 修复解析，解析失败时回退到正则抽取，不会为此重新请求。
+
+SIDES = ("Pro", "Con")
+TURN_MAX_TOKENS = 160
+SCORE_PATTERN = {c: re.compile(rf'"?{c}"?\s*[:：]\s*(\d+(?:\.\d+)?)') for c in CATEGORIES}
+
+FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+NUMBER_CHARS = tuple("0123456789.-")
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="judge")
+
+
+def _balanced_object(text):
+    """
+    取出第一个括号配平的 {...}；被截断的对象自动补齐引号与右括号。
+    截断处正好落在数字上时不补齐、返回 None：'"Expression": 8' 可能本来是 85，补齐会得到错误的分数。
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth, in_str, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    if not in_str and text[start:].rstrip()[-1:] in NUMBER_CHARS:
+        return None
+    return text[start:] + ('"' if in_str else "") + "}" * depth
+
+
+def _cut_in_number(text):
+    """回复是否是在 JSON 对象的某个数字中间被截断的"""
+    return "{" in text and _balanced_object(text) is None
+
+
+def _loosen(candidate):
+    """修复模型常见的 JSON 瑕疵：尾逗号、中文引号、单引号、未加引号的键"""
+    fixed = candidate.replace("“", '"').replace("”", '"')
+    if '"' not in fixed:
+        fixed = fixed.replace("'", '"')
+    fixed = re.sub(r"([{,]\s*)([A-Za-z_]\w*)(\s*:)", r'\1"\2"\3', fixed)
+    return re.sub(r",\s*([}\]])", r"\1", fixed)
+
+
+def repair_json(text):
+    """尽力从模型回复中解析出 JSON 对象，失败返回 None (不需要再请求一次)"""
+    text = text or ""
+    fenced = FENCE_PATTERN.search(text)
+    if fenced:
+        text = fenced.group(1)
+    candidate = _balanced_object(text)
+    if candidate is None:
+        return None
+    for attempt in (candidate, _loosen(candidate)):
+        try:
+            data = json.loads(attempt)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+
+def build_turn_prompt(topic, side, identity, content, previous=None):
+    rebuttal = f"Opponent's previous turn: {previous}\n" if previous else ""
+    return f"""
+                Debate topic: {topic}
+                {rebuttal}Score ONLY this single turn by {side} (identity: {identity}): {content}
+                Output JSON ONLY, scores are integers 0-100, Comment is one short sentence in Chinese:
+                {{"Logic": 80, "Evidence": 75, "Expression": 85, "Comment": "点评"}}
+                """
+
+
+def parse_turn_score(text):
+    """
+    解析单轮评分：先走 JSON 修复，失败再用正则逐项抽取；任一维度缺失返回 None。
+    在数字中间被截断时，末尾那个不完整的数字不算数，该轮按评分失败处理。
+    """
+    text = text or ""
+    data = repair_json(text) or {}
+    end = len(text.rstrip()) if _cut_in_number(text) else None
+    score = {}
+    for c in CATEGORIES:
+        value = data.get(c)
+        if value is None:
+            match = SCORE_PATTERN[c].search(text)
+            value = match.group(1) if match and match.end() != end else None
+        try:
+            score[c] = max(0, min(100, int(float(value))))
+        except (TypeError, ValueError):
+            return None
+    score["Comment"] = str(data.get("Comment", "")).strip()
+    return score
+
+
+def _turn_request(analyst, prompt):
+    params = sampling_params(analyst.config)
+    params["max_tokens"] = TURN_MAX_TOKENS
+    return analyst.build_messages([{"role": "user", "content": prompt}]), analyst.config["model"], params
+
+
+def score_turn(analyst, topic, side, identity, content, previous=None):
+    messages, model, params = _turn_request(analyst, build_turn_prompt(topic, side, identity, content, previous))
+    text, _ = analyst.gateway.complete(messages, model=model, label="judge", **params)
+    return parse_turn_score(text)
+
+
+async def ascore_turn(gateway, analyst, topic, side, identity, content, previous=None):
+    """批量运行器使用的异步版本"""
+    messages, model, params = _turn_request(analyst, build_turn_prompt(topic, side, identity, content, previous))
+    text, usage = await gateway.acomplete(messages, model=model, label="judge", **params)
+    return parse_turn_score(text), usage
+
+
+def aggregate(scored):
+    """
+    scored: [(side, score 或 None)]。按各方平均分汇总成与原裁判相同结构的裁决：
+    {"Pro": {...}, "Con": {...}, "Winner": ..., "Comment": ..., "Turns": 已评轮数}
+    任一方没有评分成功的发言时无法比较，Winner 为 None (未决)。
+    """
+    sums = {side: {c: 0 for c in CATEGORIES} for side in SIDES}
+    counts = {side: 0 for side in SIDES}
+    best = {}
+    for side, score in scored:
+        if not score or side not in sums:
+            continue
+        counts[side] += 1
+        for c in CATEGORIES:
+            sums[side][c] += score[c]
+        total = sum(score[c] for c in CATEGORIES)
+        if score.get("Comment") and total > best.get(side, (-1, ""))[0]:
+            best[side] = (total, score["Comment"])
+
+    verdict = {}
+    for side in SIDES:
+        n = counts[side] or 1
+        verdict[side] = {c: round(sums[side][c] / n) for c in CATEGORIES}
+    totals = {side: sum(verdict[side].values()) for side in SIDES}
+    missing = [side for side in SIDES if not counts[side]]
+    if missing:
+        verdict["Winner"] = None
+        verdict["Comment"] = f"{'、'.join('正方' if side == 'Pro' else '反方' for side in missing)}没有评分成功的发言，无法裁决。"
+    else:
+        verdict["Winner"] = "Pro" if totals["Pro"] >= totals["Con"] else "Con"
+        comments = [f"正方均分 {totals['Pro'] / len(CATEGORIES):.1f}，反方均分 {totals['Con'] / len(CATEGORIES):.1f}。"]
+        comments += [f"{'正方' if side == 'Pro' else '反方'}最佳发言：{best[side][1]}" for side in SIDES if side in best]
+        verdict["Comment"] = " ".join(comments)
+    verdict["Turns"] = counts
+    return verdict
+
+
+class IncrementalJudge:
+    """
+    一场辩论的增量裁判：submit 立即返回，评分在后台线程池中完成。
+    checkpoint: 可选的辩论存档，每轮评分完成即追加写入
+    """
+
+    def __init__(self, topic, pro_identity, con_identity):
+        self.topic = topic
+        self.identities = {"Pro": pro_identity, "Con": con_identity}
+        self.futures = []  # [(side, Future)]
+        self.last_content = None
+        self.checkpoint = None
+
+    def submit(self, analyst, side, content):
+        future = _executor.submit(
+            score_turn, analyst, self.topic, side, self.identities[side], content, self.last_content
+        )
+        if self.checkpoint is not None:
+            checkpoint, turn = self.checkpoint, len(self.futures)
+
+            def save(f):
+                if f.exception() is None:
+                    checkpoint.record_score(turn, side, f.result())
+
+            future.add_done_callback(save)
+        self.futures.append((side, future))
+        self.last_content = content
+
+    def restore(self, scored, last_content=None):
+        """从存档恢复已完成的逐轮评分 [(side, score 或 None)]，不重新请求"""
+        for side, score in scored:
+            future = Future()
+            future.set_result(score)
+            self.futures.append((side, future))
+        self.last_content = last_content
+
+    def _results(self, futures):
+        return [(side, f.result()) for side, f in futures if f.exception() is None]
+
+    def tallies(self):
+        """只汇总已完成的评分，不阻塞；返回 (当前裁决, 待完成数)"""
+        done = [(side, f) for side, f in self.futures if f.done()]
+        return aggregate(self._results(done)), len(self.futures) - len(done)
+
+    def verdict(self, timeout=None):
+        """等待所有评分完成后汇总出最终裁决"""
+        wait([f for _, f in self.futures], timeout=timeout)
+        done = [(side, f) for side, f in self.futures if f.done()]
+        return aggregate(self._results(done))
@@ -0,0 +1,333 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from debate_memory import estimate_tokens
+from metrics import METRICS
+from response_cache import get_response_cache
+
+# ==========================================
+# 统一 LLM 网关 (连接池 + 并发限制 + 超时/退避)
+# ==========================================
+# 每个 (api_key, base_url) 只创建一个网关，内部复用同一个 OpenAI 客户端，
+# 其 HTTP 连接池保持长连接，Pro / Con / Analyst / 摘要调用不再重复 TCP/TLS 握手。
+# 同步接口给 Streamlit 使用，异步接口给批量运行器使用。
+# 所有调用先查 SQLite 响应缓存 (见 response_cache.py)，命中时不产生任何 API 延迟，usage 返回 None。
+# openai SDK 导入较重，推迟到首次创建网关时才导入，页面冷启动不为它付费。
+# 每次调用都记录首 token 延迟、总延迟、token 用量、重试与缓存命中 (见 metrics.py)，label 标明调用方。
+# 多用户部署时设置 DEBATE_SERVING_URL，所有调用改走 serving.py 的排队服务：
+# 请求头带上租户 (X-Debate-Tenant)、调用方 (X-Debate-Label) 与任务类别 (X-Debate-Kind)，由服务端统一限速与排优先级。
+
+MODEL = "deepseek-chat"
+UPSTREAM_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")  # 可指向本地兼容服务做测试
+SERVING_URL = os.environ.get("DEBATE_SERVING_URL")
+BASE_URL = SERVING_URL or UPSTREAM_URL
+SAMPLING_KEYS = ("temperature", "max_tokens", "top_p", "frequency_penalty", "presence_penalty", "stop", "response_format")
+
+
+def retryable_errors():
+    """可重试的异常类型 (用到时才导入 openai)"""
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+    )
+
+
+class RetryPolicy:
+    """超时与指数退避策略。"""
+
+    def __init__(self, timeout=120.0, max_retries=3, base_delay=1.0, max_delay=30.0):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """第 attempt 次失败后的等待时间 (带抖动，避免多个请求同时重试)"""
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * (0.5 + random.random())
+
+
+class RateLimiter:
+    """
+    令牌桶：平均每秒 rate 个请求，最多允许 burst 个突发；rate 为 None 表示不限。
+    acquire 为异步接口；ready / take / wait_time 为不阻塞的同步接口，由调用方自行加锁 (见 serving.Scheduler)。
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate or 1))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def ready(self, now=None):
+        """补充令牌并判断是否可以立即发出一个请求"""
+        now = time.monotonic() if now is None else now
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return not self.rate or self.tokens >= 1
+
+    def take(self):
+        if self.rate:
+            self.tokens -= 1
+
+    def wait_time(self):
+        """距下一个令牌就绪的秒数"""
+        return 0.0 if not self.rate else max(0.0, (1 - self.tokens) / self.rate)
+
+    async def acquire(self):
+        async with self._lock:
+            while not self.ready():
+                await asyncio.sleep(self.wait_time())
+            self.take()
+
+
+def sampling_params(config):
+    """从 llm_config 条目中取出采样参数"""
+    return {k: config[k] for k in SAMPLING_KEYS if k in config}
+
+
+class LLMGateway:
+    """
+    单个 API Key 的调用入口。
+    参数: max_concurrency (同一 Key 同时在途的请求上限), rps (异步接口的每秒请求上限，None 表示不限)
+    各调用方法的 tenant (排队服务中的租户，通常是一个浏览器会话) 与 kind (任务类别，如 "batch")
+    只作为该次请求的请求头发送，不同租户共用同一个客户端、连接池与并发上限。
+    """
+
+    def __init__(self, api_key, base_url=BASE_URL, max_concurrency=8, rps=None, policy=None, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.rps = rps
+        self.policy = policy or RetryPolicy()
+        self.cache = cache if cache is not None else get_response_cache()
+        from openai import OpenAI
+
+        # 重试由网关统一处理，客户端自身不再重试
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=self.policy.timeout, max_retries=0)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async = {}  # 事件循环 -> (AsyncOpenAI, Semaphore, RateLimiter)
+        self._async_lock = threading.Lock()
+
+    @staticmethod
+    def _headers(label, tenant=None, kind=None):
+        """每次请求的标记头：调用方 (X-Debate-Label)，以及可选的租户 (X-Debate-Tenant) 与任务类别 (X-Debate-Kind)"""
+        headers = {"X-Debate-Label": label}
+        if tenant:
+            headers["X-Debate-Tenant"] = tenant
+        if kind:
+            headers["X-Debate-Kind"] = kind
+        return headers
+
+    def _lookup(self, model, messages, params):
+        if self.cache is None:
+            return None, None
+        return self.cache.lookup(model, messages, params)
+
+    def _save(self, key, text):
+        if key is not None:
+            self.cache.save(key, text)
+
+    # --- 同步接口 ---
+    def complete(self, messages, model=MODEL, label="llm", tenant=None, kind=None, **params):
+        """一次完整调用，返回 (文本, usage)。"""
+        with METRICS.timer("llm", label, model) as call:
+            key, cached = self._lookup(model, messages, params)
+            if cached is not None:
+                call.cache_hit = True
+                return cached, None
+            for attempt in range(self.policy.max_retries + 1):
+                try:
+                    with self._slots:
+                        response = self.client.chat.completions.create(
+                            model=model, messages=messages, extra_headers=self._headers(label, tenant, kind), **params,
+                        )
+                    choice = response.choices[0]
+                    text = choice.message.content or ""
+                    call.usage, call.truncated = response.usage, choice.finish_reason == "length"
+                    self._save(key, text)
+                    return text, response.usage
+                except retryable_errors():
+                    if attempt == self.policy.max_retries:
+                        raise
+                    call.retries += 1
+                    time.sleep(self.policy.delay(attempt))
+
+    def stream(self, messages, model=MODEL, label="llm", cutter=None, tenant=None, kind=None, **params):
+        """
+        流式调用，逐块产出文本；只在首个 token 到达前重试，避免重复输出。
+        cutter: 判断何时结束的裁剪器 (见 turn_control.TurnCutter)，判定结束后立即断开连接，不再为后续 token 等待。
+        tenant / kind: 本次请求在排队服务中的租户与任务类别 (如预生成的 "speculative")。
+        """
+        with METRICS.timer("llm", label, model) as call:
+            key, cached = self._lookup(model, messages, params)
+            if cached is not None:
+                call.cache_hit = True
+                yield cached if cutter is None else cutter.trim(cached)
+                return
+            for attempt in range(self.policy.max_retries + 1):
+                started = False
+                pieces = []
+                try:
+                    with self._slots:
+                        # include_usage：最后一个 chunk 附带 token 用量
+                        stream = self.client.chat.completions.create(
+                            model=model, messages=messages, stream=True,
+                            stream_options={"include_usage": True}, extra_headers=self._headers(label, tenant, kind), **params,
+                        )
+                        with stream:  # 提前结束或调用方中途放弃时关闭连接，服务端随之停止生成
+                            for chunk in stream:
+                                if chunk.usage is not None:
+                                    call.usage = chunk.usage
+                                if not chunk.choices:
+                                    continue
+                                choice = chunk.choices[0]
+                                if choice.finish_reason == "length":
+                                    call.truncated = True
+                                delta = choice.delta.content
+                                if not delta:
+                                    continue
+                                started = True
+                                call.first_token()
+                                if cutter is not None:
+                                    delta = cutter.feed(delta)
+                                if delta:
+                                    pieces.append(delta)
+                                    yield delta
+                                if cutter is not None and cutter.done:
+                                    call.early_stop = True
+                                    break
+                        if cutter is not None and not cutter.done:
+                            tail = cutter.flush()
+                            if tail:
+                                pieces.append(tail)
+                                yield tail
+                    text = "".join(pieces)
+                    if call.early_stop:
+                        # 断开后收不到 usage，按估算记账
+                        call.usage = {"prompt_tokens": sum(estimate_tokens(str(m.get("content") or "")) for m in messages),
+                                      "completion_tokens": estimate_tokens(text)}
+                    # 只缓存完整结束 (或已判定结束) 的流
+                    self._save(key, text)
+                    return
+                except retryable_errors():
+                    if started or attempt == self.policy.max_retries:
+                        raise
+                    call.retries += 1
+                    time.sleep(self.policy.delay(attempt))
+
+    # --- 异步接口 ---
+    def _async_state(self):
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            state = self._async.get(loop)
+            if state is None:
+                from openai import AsyncOpenAI
+
+                client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.policy.timeout, max_retries=0)
+                limiter = RateLimiter(self.rps) if self.rps else None
+                state = (client, asyncio.Semaphore(self.max_concurrency), limiter)
+                self._async[loop] = state
+            return state
+
+    async def acomplete(self, messages, model=MODEL, label="llm", tenant=None, kind=None, **params):
+        """异步版 complete，受并发上限与令牌桶限速约束。"""
+        with METRICS.timer("llm", label, model) as call:
+            key, cached = self._lookup(model, messages, params)
+            if cached is not None:
+                call.cache_hit = True
+                return cached, None
+            client, slots, limiter = self._async_state()
+            for attempt in range(self.policy.max_retries + 1):
+                if limiter is not None:
+                    await limiter.acquire()
+                try:
+                    async with slots:
+                        response = await client.chat.completions.create(
+                            model=model, messages=messages, extra_headers=self._headers(label, tenant, kind), **params,
+                        )
+                    choice = response.choices[0]
+                    text = choice.message.content or ""
+                    call.usage, call.truncated = response.usage, choice.finish_reason == "length"
+                    self._save(key, text)
+                    return text, response.usage
+                except retryable_errors():
+                    if attempt == self.policy.max_retries:
+                        raise
+                    call.retries += 1
+                    await asyncio.sleep(self.policy.delay(attempt))
+
+    async def aclose(self):
+        """关闭当前事件循环上的异步客户端"""
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            state = self._async.pop(loop, None)
+        if state is not None:
+            await state[0].close()
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+class TaggedGateway:
+    """
+    共享网关的轻量视图：每次调用自动带上租户与任务类别请求头，其余属性都转给底层网关。
+    并发上限、限速与连接池仍按 (api_key, base_url) 共享，不会因租户不同而被拆开。
+    """
+
+    def __init__(self, gateway, tenant=None, kind=None):
+        self.gateway = gateway
+        self.tenant = tenant
+        self.kind = kind
+
+    def __getattr__(self, name):
+        return getattr(self.gateway, name)
+
+    def _tags(self, params):
+        """调用方显式给出的 tenant / kind 优先"""
+        for name in ("tenant", "kind"):
+            if params.get(name) is None:
+                params[name] = getattr(self, name)
+        return params
+
+    def complete(self, messages, **params):
+        return self.gateway.complete(messages, **self._tags(params))
+
+    def stream(self, messages, **params):
+        return self.gateway.stream(messages, **self._tags(params))
+
+    async def acomplete(self, messages, **params):
+        return await self.gateway.acomplete(messages, **self._tags(params))
+
+
+def get_gateway(api_key, base_url=BASE_URL, tenant=None, kind=None, **options):
+    """
+    按 (api_key, base_url) 返回进程内共享的网关；options 只在首次创建时生效。
+    给出 tenant / kind 时返回带这些请求头的视图，底层仍是同一个网关。
+    """
+    key = (api_key, base_url or BASE_URL)
+    with _gateways_lock:
+        gateway = _gateways.get(key)
+        if gateway is None:
+            gateway = LLMGateway(api_key, key[1], **options)
+            _gateways[key] = gateway
+    return TaggedGateway(gateway, tenant, kind) if tenant or kind else gateway
+
+
+def gateway_for(config):
+    """llm_config 条目对应的共享网关 (请求带上其中的 tenant)"""
+    return get_gateway(config["api_key"], config.get("base_url"), tenant=config.get("tenant"))
+
+
+def autogen_config_list(api_key, base_url=BASE_URL, model=MODEL):
+    """给 AutoGen 脚本用的统一 config_list (AutoGen 内部自建客户端，这里只统一配置来源)"""
+    return [{"model": model, "api_key": api_key, "base_url": base_url}]
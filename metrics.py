@@ -0,0 +1,253 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# ==========================================
+# 指标与调用追踪 (延迟 / token / 重试 / 缓存命中 / 费用)
+# ==========================================
+# 所有 LLM、PDF 解析与搜索调用都经 METRICS.timer(...) 记录一条调用记录：
+#   ttft       首个 token 延迟 (非流式调用等于总延迟)
+#   latency    总延迟
+#   tokens     prompt / completion token 数 (缓存命中为 0)
+#   retries    重试次数；cache_hit 是否命中缓存；error 异常类型
+#   truncated  被 max_tokens 截断；early_stop 流式读取时判定发言已结束而提前断开
+#   cancelled  调用方主动放弃 (关闭流式生成器、取消协程，如作废的预生成)，不计为失败
+# 汇总结果可导出为 Prometheus 文本格式；每条记录同时追加到内存环形缓冲，
+# 设置 DEBATE_TRACE_PATH 时还会写入 JSONL 追踪文件。
+# 费用按 DeepSeek 标准价估算 (美元 / 百万 token)，可用环境变量覆盖。
+
+TRACE_PATH = os.environ.get("DEBATE_TRACE_PATH")
+PRICE_INPUT = float(os.environ.get("DEBATE_PRICE_INPUT", "0.28"))
+PRICE_INPUT_CACHED = float(os.environ.get("DEBATE_PRICE_INPUT_CACHED", "0.028"))
+PRICE_OUTPUT = float(os.environ.get("DEBATE_PRICE_OUTPUT", "0.42"))
+SAMPLE_SIZE = 1024   # 每个序列保留的最近延迟样本数 (用于分位数)
+TRACE_SIZE = 1000    # 内存中保留的最近调用记录数
+QUANTILES = (0.5, 0.9, 0.99)
+CANCELLED = (GeneratorExit, asyncio.CancelledError)  # 正常的取消，不是调用失败
+
+
+def _usage_value(usage, name):
+    if usage is None:
+        return 0
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return value or 0
+
+
+def estimate_cost(prompt_tokens, completion_tokens, cached_tokens=0):
+    """按单价估算一次调用的费用 (美元)"""
+    fresh = prompt_tokens - cached_tokens
+    return (fresh * PRICE_INPUT + cached_tokens * PRICE_INPUT_CACHED + completion_tokens * PRICE_OUTPUT) / 1e6
+
+
+def quantile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Series:
+    """同一 (kind, label) 下所有调用的累计值"""
+
+    __slots__ = ("calls", "errors", "cancelled", "cache_hits", "retries", "truncated", "early_stops", "prompt_tokens",
+                 "completion_tokens", "cached_tokens", "cost", "latencies", "ttfts")
+
+    def __init__(self):
+        self.calls = self.errors = self.cancelled = self.cache_hits = self.retries = self.truncated = self.early_stops = 0
+        self.prompt_tokens = self.completion_tokens = self.cached_tokens = 0
+        self.cost = 0.0
+        self.latencies = deque(maxlen=SAMPLE_SIZE)
+        self.ttfts = deque(maxlen=SAMPLE_SIZE)
+
+
+class CallTimer:
+    """
+    一次调用的计时器，用 with 包住调用：
+        with METRICS.timer("llm", "Pro", model) as call:
+            ...; call.first_token(); call.usage = response.usage
+    退出时自动记录；with 块内抛出的异常记为 error，调用方关闭生成器或取消协程记为 cancelled。
+    """
+
+    def __init__(self, metrics, kind, label, model=None):
+        self.metrics = metrics
+        self.kind = kind
+        self.label = label
+        self.model = model
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.usage = None
+        self.retries = 0
+        self.cache_hit = False
+        self.truncated = False
+        self.early_stop = False
+        self.extra = {}
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        latency = time.perf_counter() - self.started
+        prompt = _usage_value(self.usage, "prompt_tokens")
+        completion = _usage_value(self.usage, "completion_tokens")
+        cached = _usage_value(self.usage, "prompt_cache_hit_tokens")
+        cancelled = exc_type is not None and issubclass(exc_type, CANCELLED)
+        record = {
+            "ts": round(time.time(), 3),
+            "kind": self.kind,
+            "label": self.label,
+            "model": self.model,
+            "latency": round(latency, 4),
+            "ttft": round(self.ttft if self.ttft is not None else latency, 4),
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "cached_tokens": cached,
+            "cost": estimate_cost(prompt, completion, cached) if self.kind == "llm" else 0.0,
+            "retries": self.retries,
+            "cache_hit": self.cache_hit,
+            "truncated": self.truncated,
+            "early_stop": self.early_stop,
+            "cancelled": cancelled,
+            "error": exc_type.__name__ if exc_type and not cancelled else None,
+        }
+        record.update(self.extra)
+        self.metrics.record(record)
+        return None
+
+
+class Metrics:
+    """进程内指标注册表 (线程安全)"""
+
+    def __init__(self, trace_path=TRACE_PATH):
+        self.trace_path = trace_path
+        self.series = {}                 # (kind, label) -> Series
+        self.trace = deque(maxlen=TRACE_SIZE)
+        self._lock = threading.Lock()
+
+    def timer(self, kind, label, model=None):
+        return CallTimer(self, kind, label, model)
+
+    def record(self, record):
+        with self._lock:
+            s = self.series.get((record["kind"], record["label"]))
+            if s is None:
+                s = self.series[(record["kind"], record["label"])] = Series()
+            s.calls += 1
+            s.errors += record["error"] is not None
+            s.cancelled += record.get("cancelled", False)
+            s.cache_hits += record["cache_hit"]
+            s.retries += record["retries"]
+            s.truncated += record["truncated"]
+            s.early_stops += record["early_stop"]
+            s.prompt_tokens += record["prompt_tokens"]
+            s.completion_tokens += record["completion_tokens"]
+            s.cached_tokens += record["cached_tokens"]
+            s.cost += record["cost"]
+            if not record.get("cancelled"):
+                # 中途放弃的调用只有部分耗时，不计入延迟分位数
+                s.latencies.append(record["latency"])
+                if not record["cache_hit"]:
+                    s.ttfts.append(record["ttft"])
+            self.trace.append(record)
+            if self.trace_path:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self):
+        """每个 (kind, label) 一行的汇总，供侧边栏面板使用"""
+        with self._lock:
+            items = list(self.series.items())
+        rows = []
+        for (kind, label), s in sorted(items):
+            rows.append({
+                "kind": kind,
+                "label": label,
+                "calls": s.calls,
+                "p50": quantile(s.latencies, 0.5),
+                "p95": quantile(s.latencies, 0.95),
+                "ttft_p50": quantile(s.ttfts, 0.5),
+                "prompt_tokens": s.prompt_tokens,
+                "completion_tokens": s.completion_tokens,
+                "cache_hits": s.cache_hits,
+                "retries": s.retries,
+                "truncated": s.truncated,
+                "early_stops": s.early_stops,
+                "errors": s.errors,
+                "cancelled": s.cancelled,
+                "cost": s.cost,
+            })
+        return rows
+
+    def total_cost(self):
+        with self._lock:
+            return sum(s.cost for s in self.series.values())
+
+    def trace_jsonl(self):
+        with self._lock:
+            return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self.trace)
+
+    def prometheus(self):
+        """导出为 Prometheus 文本格式 (0.0.4)"""
+        with self._lock:
+            items = sorted(self.series.items())
+            snapshot = [(k, s, list(s.latencies), list(s.ttfts)) for k, s in items]
+        lines = []
+
+        def block(name, kind_, help_text, rows):
+            lines.append(f"# HELP debate_{name} {help_text}")
+            lines.append(f"# TYPE debate_{name} {kind_}")
+            lines.extend(rows)
+
+        def labels(kind, label, **more):
+            pairs = {"kind": kind, "label": label, **more}
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in pairs.items()) + "}"
+
+        summaries = (
+            ("latency_seconds", "Total call latency", 2),
+            ("ttft_seconds", "Time to first token (cache misses only)", 3),
+        )
+        for name, help_text, column in summaries:
+            rows = []
+            for entry in snapshot:
+                kind, label = entry[0]
+                samples = entry[column]
+                for q in QUANTILES:
+                    rows.append(f"debate_{name}{labels(kind, label, quantile=q)} {quantile(samples, q):.6f}")
+                rows.append(f"debate_{name}_sum{labels(kind, label)} {sum(samples):.6f}")
+                rows.append(f"debate_{name}_count{labels(kind, label)} {len(samples)}")
+            block(name, "summary", help_text, rows)
+
+        counters = (
+            ("calls_total", "Calls", lambda s: [({}, s.calls)]),
+            ("errors_total", "Failed calls", lambda s: [({}, s.errors)]),
+            ("cancelled_total", "Calls abandoned by the caller", lambda s: [({}, s.cancelled)]),
+            ("cache_hits_total", "Calls served from cache", lambda s: [({}, s.cache_hits)]),
+            ("retries_total", "Retried attempts", lambda s: [({}, s.retries)]),
+            ("truncated_total", "Replies cut off by max_tokens", lambda s: [({}, s.truncated)]),
+            ("early_stops_total", "Streams closed once the turn was complete", lambda s: [({}, s.early_stops)]),
+            ("tokens_total", "Tokens", lambda s: [({"type": "prompt"}, s.prompt_tokens),
+                                                  ({"type": "completion"}, s.completion_tokens),
+                                                  ({"type": "cached_prompt"}, s.cached_tokens)]),
+            ("cost_usd_total", "Estimated cost in USD", lambda s: [({}, round(s.cost, 8))]),
+        )
+        for name, help_text, values in counters:
+            block(name, "counter", help_text, [
+                f"debate_{name}{labels(kind, label, **extra)} {value}"
+                for (kind, label), s, _, _ in snapshot for extra, value in values(s)
+            ])
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.series.clear()
+            self.trace.clear()
+
+
+# 进程内共享的默认注册表
+METRICS = Metrics()
@@ -0,0 +1,245 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# 本地模拟 DeepSeek 服务 (OpenAI 兼容)
+# ==========================================
+# 供基准测试与离线开发使用，不消耗 API 额度。支持：
+#   /v1/chat/completions  普通与流式 (SSE，含 include_usage)、JSON 模式 (裁判评分)、函数/工具调用
+#   /v1/models
+# 可配置首 token 延迟 (latency ± jitter)、生成速度 (token_rate，token/秒)、回复长度与故障注入
+# (failure_rate 的概率返回 429/500)。ramble_tokens > 0 时模拟模型在核心论点行之后继续替对方写下一轮；
+# 请求中的 stop 与 max_tokens 会像真实服务一样生效，客户端提前断开时停止生成。用法：
+#   python mock_server.py --port 8765 --latency 0.3 --token-rate 60 --failure-rate 0.05
+#   DEEPSEEK_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+
+SENTENCES = (
+    "从工程实践看，这一方案的维护成本更低。",
+    "对方忽略了规模化部署时的稳定性问题。",
+    "公开数据显示，相关岗位需求仍在增长。",
+    "真正决定成败的是团队的交付效率。",
+    "任何技术选型都必须回到业务场景本身。",
+)
+
+
+class MockConfig:
+    """
+    参数: latency (首 token 平均延迟，秒), jitter (延迟抖动比例), token_rate (每秒生成 token 数，0 为不限),
+    reply_tokens (每次回复的 token 数), failure_rate (请求失败概率), seed (随机种子),
+    ramble_tokens (核心论点之后多写的 "下一轮" token 数)
+    """
+
+    def __init__(self, latency=0.2, jitter=0.2, token_rate=50.0, reply_tokens=120, failure_rate=0.0, seed=None,
+                 ramble_tokens=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.failure_rate = failure_rate
+        self.ramble_tokens = ramble_tokens
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "failures": 0, "streams": 0, "tool_calls": 0, "aborted": 0}
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def roll(self):
+        with self._lock:
+            return self.random.random()
+
+    def first_token_delay(self):
+        return max(0.0, self.latency * (1 + self.jitter * (2 * self.roll() - 1)))
+
+    def token_interval(self):
+        return 1.0 / self.token_rate if self.token_rate else 0.0
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in ("latency", "jitter", "token_rate", "reply_tokens", "failure_rate", "ramble_tokens")}
+
+
+def _prompt_tokens(messages):
+    return sum(len(str(m.get("content") or "")) for m in messages) // 2 + 1
+
+
+def _sentences(seq, tokens):
+    text = ""
+    i = seq
+    while len(text) < tokens * 2:
+        text += SENTENCES[i % len(SENTENCES)]
+        i += 1
+    return text[:tokens * 2]
+
+
+def _reply_pieces(config, seq, stop=None, max_tokens=None):
+    """
+    生成约 reply_tokens 个 token 的辩论式回复 (每个片段约 1 个 token)，末尾附核心论点行；
+    ramble_tokens > 0 时接着写出对方的下一轮。返回 (片段, finish_reason)，stop / max_tokens 与真实服务一致。
+    """
+    text = _sentences(seq, config.reply_tokens) + f"\n【核心论点】：{SENTENCES[seq % len(SENTENCES)]}"
+    if config.ramble_tokens:
+        text += f"\n\n反方：{_sentences(seq + 1, config.ramble_tokens)}\n【核心论点】：{SENTENCES[(seq + 1) % len(SENTENCES)]}"
+    if isinstance(stop, str):
+        stop = [stop]
+    cuts = [text.find(s) for s in stop or () if s and s in text]
+    if cuts:
+        text = text[:min(cuts)]
+    pieces = [text[j:j + 2] for j in range(0, len(text), 2)]
+    if max_tokens and len(pieces) > max_tokens:
+        return pieces[:max_tokens], "length"
+    return pieces, "stop"
+
+
+def _wants_tool(body):
+    """请求带了函数/工具且上一条不是工具结果时，模拟一次搜索调用"""
+    if not (body.get("functions") or body.get("tools")):
+        return False
+    last = (body.get("messages") or [{}])[-1]
+    return last.get("role") not in ("function", "tool")
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._json(200, {"object": "list", "data": [{"id": "deepseek-chat", "object": "model"}]})
+            else:
+                self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            config.count("requests")
+            time.sleep(config.first_token_delay())
+            if config.roll() < config.failure_rate:
+                config.count("failures")
+                status = 429 if config.roll() < 0.5 else 500
+                self._json(status, {"error": {"message": "injected failure", "type": "mock_error"}})
+                return
+
+            seq = config.stats["requests"]
+            model = body.get("model", "deepseek-chat")
+            messages = body.get("messages") or []
+            message = {"role": "assistant", "content": None}
+            finish = "stop"
+            if (body.get("response_format") or {}).get("type") == "json_object":
+                scores = [60 + int(config.roll() * 35) for _ in range(3)]
+                content = json.dumps({"Logic": scores[0], "Evidence": scores[1], "Expression": scores[2], "Comment": "论证完整"}, ensure_ascii=False)
+                pieces = [content]
+            elif _wants_tool(body):
+                config.count("tool_calls")
+                arguments = json.dumps({"query": SENTENCES[seq % len(SENTENCES)][:8]}, ensure_ascii=False)
+                if body.get("tools"):
+                    message["tool_calls"] = [{"id": f"call_{seq}", "type": "function",
+                                              "function": {"name": body["tools"][0]["function"]["name"], "arguments": arguments}}]
+                else:
+                    message["function_call"] = {"name": body["functions"][0]["name"], "arguments": arguments}
+                pieces = []
+            else:
+                pieces, finish = _reply_pieces(config, seq, body.get("stop"), body.get("max_tokens"))
+            usage = {"prompt_tokens": _prompt_tokens(messages), "completion_tokens": len(pieces) or 1}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+            if body.get("stream"):
+                config.count("streams")
+                try:
+                    self._stream(model, pieces, finish, usage, (body.get("stream_options") or {}).get("include_usage"))
+                except (BrokenPipeError, ConnectionResetError):
+                    config.count("aborted")  # 客户端提前断开，剩余 token 不再生成
+                return
+            if pieces:
+                message["content"] = "".join(pieces)
+                time.sleep(config.token_interval() * len(pieces))
+            if not pieces:
+                finish = "tool_calls" if message.get("tool_calls") else "function_call"
+            self._json(200, {
+                "id": f"mock-{seq}", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+                "usage": usage,
+            })
+
+        def _stream(self, model, pieces, finish, usage, include_usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def send(choices, **extra):
+                chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": choices, **extra}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            interval = config.token_interval()
+            for piece in pieces:
+                send([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                if interval:
+                    time.sleep(interval)
+            send([{"index": 0, "delta": {}, "finish_reason": finish}])
+            if include_usage:
+                send([], usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_mock_server(host="127.0.0.1", port=0, config=None):
+    """在后台线程启动模拟服务，返回 (server, base_url)；port=0 时自动选择空闲端口"""
+    config = config or MockConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 DeepSeek (OpenAI 兼容) 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="首 token 平均延迟 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟抖动比例")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="每秒生成 token 数，0 为不限")
+    parser.add_argument("--reply-tokens", type=int, default=120, help="每次回复的 token 数")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="请求失败 (429/500) 概率")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--ramble-tokens", type=int, default=0, help="核心论点之后多写的下一轮 token 数")
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.jitter, args.token_rate, args.reply_tokens, args.failure_rate, args.seed,
+                        args.ramble_tokens)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f"mock DeepSeek 服务已启动：http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(config.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import METRICS
+from response_cache import CACHE_DIR
+
+# ==========================================
+# PDF 并行解析 + 磁盘文本缓存
+# ==========================================
+# 以文件内容的 sha256 为键，把逐页文本写入磁盘 (gzip JSON)。
+# 缓存目录可被同一台机器上的所有 Streamlit worker 共享，重启后依然有效；
+# 总大小超过上限时按最近访问时间淘汰。
+
+PDF_CACHE_DIR = os.path.join(CACHE_DIR, "pdf_text")
+PDF_CACHE_MAX_BYTES = int(os.environ.get("DEBATE_PDF_CACHE_MB", "256")) * 1024 * 1024
+PAGES_PER_TASK = 16      # 每个进程任务负责的页数
+PARALLEL_MIN_PAGES = 24  # 页数太少时串行更快 (省掉进程启动与序列化开销)
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(PDF_CACHE_DIR, f"{key}.json.gz")
+
+
+# 进程池在模块级复用，不再每次上传都新建；PDF 字节写入临时文件只落盘一次，
+# 任务只传 (路径, 页码范围)，每个子进程按路径打开一次并缓存 reader，不再为每 16 页重复序列化整份 PDF
+_pool = None
+_pool_lock = threading.Lock()
+_worker_reader = (None, None)  # 子进程内：(文件标识, PdfReader)
+
+
+def _get_pool(max_workers=None):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1)
+        return _pool
+
+
+def _reset_pool():
+    """子进程崩溃后进程池不可再用，丢弃，下次重新创建"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_range(path, key, start, end):
+    """子进程任务：解析 [start, end) 范围内的页面。同一份文件在本进程内只打开一次。"""
+    import PyPDF2
+
+    global _worker_reader
+    if _worker_reader[0] != (path, key):
+        _worker_reader = ((path, key), PyPDF2.PdfReader(path))
+    reader = _worker_reader[1]
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _parse_pages(data, key, max_workers=None):
+    import PyPDF2  # 只有真正需要解析时才导入
+
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    total = len(reader.pages)
+    if total < PARALLEL_MIN_PAGES:
+        return [page.extract_text() or "" for page in reader.pages]
+
+    ranges = [(start, min(start + PAGES_PER_TASK, total)) for start in range(0, total, PAGES_PER_TASK)]
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        pool = _get_pool(max_workers)
+        try:
+            futures = [pool.submit(_extract_range, path, key, start, end) for start, end in ranges]
+            pages = []
+            for future in futures:
+                pages.extend(future.result())
+            return pages
+        except BrokenProcessPool:
+            _reset_pool()
+            return [page.extract_text() or "" for page in reader.pages]
+    finally:
+        os.remove(path)
+
+
+def load_cached(key):
+    path = _cache_path(key)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            pages = json.load(f)
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+    os.utime(path)  # 刷新访问时间，供 LRU 淘汰使用
+    return pages
+
+
+def store_cached(key, pages):
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    path = _cache_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(pages, f, ensure_ascii=False)
+    os.replace(tmp_path, path)  # 原子替换，多个 worker 并发写入也安全
+    evict(PDF_CACHE_MAX_BYTES)
+
+
+def evict(max_bytes):
+    """总大小超过 max_bytes 时，按最近访问时间从旧到新删除缓存文件。"""
+    try:
+        entries = [e for e in os.scandir(PDF_CACHE_DIR) if e.name.endswith(".json.gz")]
+    except FileNotFoundError:
+        return
+    stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+    total = sum(size for _, size, _ in stats)
+    for _, size, path in sorted(stats):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def extract_pages(data, max_workers=None):
+    """返回逐页文本列表；命中磁盘缓存时完全跳过解析。"""
+    with METRICS.timer("pdf", "extract") as call:
+        key = content_key(data)
+        pages = load_cached(key)
+        call.cache_hit = pages is not None
+        if pages is None:
+            pages = _parse_pages(data, key, max_workers)
+            store_cached(key, pages)
+        call.extra["pages"] = len(pages)
+    return pages
@@ -0,0 +1,130 @@
+import argparse
+import json
+from functools import lru_cache
+from html import escape
+
+import numpy as np
+
+# ==========================================
+# 雷达图 (纯 SVG，向量化计算 + 结果缓存)
+# ==========================================
+# 不再为每次裁决创建 matplotlib 图并在服务端栅格化：各维度的单位方向向量按维度数预先算好，
+# 每组得分只需一次 NumPy 乘法得到多边形顶点，直接拼成 SVG 字符串交给浏览器绘制。
+# 相同输入的渲染结果走 LRU 缓存；一张图可叠加任意多组得分，用于批量结果横向对比。
+# 也可直接对 batch_runner.py 的输出作图：
+#   python radar_chart.py results.jsonl -o compare.svg
+
+PRO_COLOR = "#4A90E2"
+CON_COLOR = "#E94E77"
+PALETTE = ("#4A90E2", "#E94E77", "#50B37D", "#F5A623", "#9B59B6", "#1ABC9C", "#E67E22", "#34495E", "#D35400", "#7F8C8D")
+FONT = "Microsoft YaHei, sans-serif"
+
+
+@lru_cache(maxsize=16)
+def _unit_vectors(n):
+    """n 个维度的单位方向向量 (首个维度朝正上方，顺时针排列)，形状 (n, 2)"""
+    angles = np.linspace(0, 2 * np.pi, n, endpoint=False) - np.pi / 2
+    vectors = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    vectors.setflags(write=False)
+    return vectors
+
+
+def _points(values, radius, center, max_value):
+    """values 形状 (m, n) -> 每组多边形的顶点坐标 (m, n, 2)"""
+    scaled = np.clip(np.asarray(values, dtype=float) / max_value, 0, 1) * radius
+    return center + scaled[..., None] * _unit_vectors(scaled.shape[-1])
+
+
+def _path(points):
+    return " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+
+
+@lru_cache(maxsize=256)
+def _render(categories, series, size, max_value, rings):
+    n = len(categories)
+    legend_height = 18 * len(series)
+    center = np.array([size / 2, size / 2])
+    radius = size / 2 - 48
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size + legend_height}" '
+        f'width="{size}" height="{size + legend_height}" font-family="{FONT}">'
+    ]
+
+    # 网格：同心多边形 + 辐射轴 + 维度标签
+    grid = _points(np.outer(np.arange(1, rings + 1) / rings, np.full(n, max_value)), radius, center, max_value)
+    for ring in grid:
+        parts.append(f'<polygon points="{_path(ring)}" fill="none" stroke="#d0d4db" stroke-width="1"/>')
+    for x, y in grid[-1]:
+        parts.append(f'<line x1="{center[0]:.1f}" y1="{center[1]:.1f}" x2="{x:.1f}" y2="{y:.1f}" stroke="#d0d4db"/>')
+    for label, (lx, ly) in zip(categories, center + (radius + 22) * _unit_vectors(n)):
+        parts.append(
+            f'<text x="{lx:.1f}" y="{ly:.1f}" text-anchor="middle" dominant-baseline="middle" '
+            f'font-size="13" font-weight="bold" fill="#333">{escape(label)}</text>'
+        )
+
+    # 各组得分：一次性算出全部顶点
+    polygons = _points([values for _, values, _ in series], radius, center, max_value)
+    for (name, _, color), points in zip(series, polygons):
+        parts.append(f'<polygon points="{_path(points)}" fill="{color}" fill-opacity="0.2" stroke="{color}" stroke-width="2"/>')
+        parts.extend(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="3" fill="{color}"/>' for x, y in points)
+
+    # 图例
+    for i, (name, _, color) in enumerate(series):
+        y = size + 18 * i + 4
+        parts.append(f'<rect x="12" y="{y}" width="12" height="12" fill="{color}"/>')
+        parts.append(f'<text x="30" y="{y + 10}" font-size="12" fill="#333">{escape(name)}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def radar_svg(series, categories, size=360, max_value=100, rings=4):
+    """
+    series: [(名称, 各维度得分, 颜色 或 None)]，颜色缺省时按调色板依次分配。
+    返回 SVG 字符串；相同输入直接命中缓存。
+    """
+    normalized = tuple(
+        (str(name), tuple(float(v) for v in values), color or PALETTE[i % len(PALETTE)])
+        for i, (name, values, color) in enumerate(series)
+    )
+    return _render(tuple(categories), normalized, size, max_value, rings)
+
+
+def verdict_svg(verdict, categories, pro_label="Pro", con_label="Con", size=360):
+    """单场裁决：正反方两组得分"""
+    return radar_svg([
+        (pro_label, [verdict["Pro"][c] for c in categories], PRO_COLOR),
+        (con_label, [verdict["Con"][c] for c in categories], CON_COLOR),
+    ], categories, size=size)
+
+
+def compare_svg(records, categories, sides=("Pro", "Con"), size=420):
+    """多场辩论对比：records 为 batch_runner 的输出记录，跳过失败或缺少裁决的场次"""
+    series = []
+    for record in records:
+        verdict = record.get("verdict")
+        if not verdict:
+            continue
+        for side in sides:
+            series.append((f"{record.get('id', '?')} · {side}", [verdict[side][c] for c in categories], None))
+    return radar_svg(series, categories, size=size)
+
+
+def main(argv=None):
+    from debate_core import CATEGORIES
+
+    parser = argparse.ArgumentParser(description="把 batch_runner 的结果画成一张对比雷达图 (SVG)")
+    parser.add_argument("input", help="batch_runner 输出的 JSONL")
+    parser.add_argument("-o", "--output", default="compare.svg")
+    parser.add_argument("--side", choices=("Pro", "Con", "both"), default="both", help="对比哪一方的得分")
+    args = parser.parse_args(argv)
+
+    with open(args.input, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    sides = ("Pro", "Con") if args.side == "both" else (args.side,)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(compare_svg(records, CATEGORIES, sides))
+    print(f"{sum(1 for r in records if r.get('verdict'))} 场 -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
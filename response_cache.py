@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+
+# ==========================================
+# LLM 响应缓存 (SQLite)
+# ==========================================
+# 以「模型 + 规范化后的消息 + 采样参数」为键缓存完整回复，带 TTL 与总大小淘汰。
+# 同一文件可被多个进程共享 (WAL 模式)。模式由环境变量 DEBATE_LLM_CACHE 控制：
+#   on     默认：命中直接返回，未命中调用 API 并写入
+#   off    完全不使用缓存
+#   replay 确定性回放：只读缓存，未命中直接报错 (回归测试绝不触网)
+
+CACHE_DIR = os.environ.get("DEBATE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite")
+CACHE_MODE = os.environ.get("DEBATE_LLM_CACHE", "on").lower()
+CACHE_TTL = float(os.environ.get("DEBATE_LLM_CACHE_TTL_HOURS", "168")) * 3600
+CACHE_MAX_BYTES = int(os.environ.get("DEBATE_LLM_CACHE_MB", "512")) * 1024 * 1024
+EVICT_EVERY = 64  # 每写入多少次检查一次过期与总大小
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class CacheMissError(RuntimeError):
+    """replay 模式下缓存未命中"""
+
+
+class SQLiteCache:
+    """
+    通用 SQLite 键值缓存：值为 pickle 序列化的任意对象，按最近访问时间做 LRU 淘汰。
+    同时满足 AutoGen 的 AbstractCache 协议 (get / set / close / with)，可直接传给 initiate_chat(cache=...)。
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, strict=False):
+        self.path = path
+        self.strict = strict  # 为 True 时未命中直接抛 CacheMissError (replay 模式)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _conn(self):
+        # sqlite3 连接不能跨线程共享，每个线程各开一个
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        conn = self._conn()
+        row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            if self.strict:
+                raise CacheMissError(f"replay 模式下缓存未命中：{key[:12]}")
+            return default
+        value, created = row
+        now = time.time()
+        with conn:
+            if self.ttl and now - created > self.ttl:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return default
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目；总大小仍超限时，按最近访问时间从旧到新删除。"""
+        conn = self._conn()
+        with conn:
+            if self.ttl:
+                conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # AutoGen 每次调用都会 with 一下，这里不关闭连接以便复用
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+
+def _normalize_message(message):
+    content = message.get("content")
+    if isinstance(content, str):
+        content = WHITESPACE.sub(" ", content).strip()
+    return {"role": message.get("role"), "content": content}
+
+
+def make_key(model, messages, params):
+    """模型 + 规范化消息 (合并空白) + 排序后的采样参数 -> sha256"""
+    payload = {
+        "model": model,
+        "messages": [_normalize_message(m) for m in messages],
+        "params": {k: params[k] for k in sorted(params)},
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LLM 网关使用的响应缓存：值为回复文本。"""
+
+    def __init__(self, store=None, mode=CACHE_MODE):
+        self.store = store or SQLiteCache()
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, model, messages, params):
+        """返回 (key, 缓存文本或 None)；replay 模式未命中时抛出 CacheMissError。"""
+        key = make_key(model, messages, params)
+        text = self.store.get(key)
+        if text is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise CacheMissError(f"replay 模式下缓存未命中：{key[:12]}")
+        else:
+            self.hits += 1
+        return key, text
+
+    def save(self, key, text):
+        if self.mode != "replay" and text:
+            self.store.set(key, text)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache():
+    """进程内共享的默认响应缓存；DEBATE_LLM_CACHE=off 时返回 None。"""
+    global _default_cache
+    if CACHE_MODE == "off":
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+def autogen_cache():
+    """给 AutoGen 脚本用的缓存对象 (与网关共用同一个 SQLite 文件，键空间由 AutoGen 自行计算)"""
+    if CACHE_MODE == "off":
+        return None
+    return SQLiteCache(strict=CACHE_MODE == "replay")
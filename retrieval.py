@@ -0,0 +1,105 @@
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# ==========================================
+# 本地检索 (分块 + BM25 倒排索引)
+# ==========================================
+# 文档按页切块后建立 BM25 索引，每轮只把与当前发言最相关的 top-k 片段注入 prompt，
+# prompt 大小与文档页数无关。全部在本地完成，不依赖网络。
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|[一-鿿]+")
+
+
+def tokenize(text):
+    """英文/数字按词切分，中文按字二元组 (bigram) 切分，单字词也保留。"""
+    tokens = []
+    for piece in WORD_PATTERN.findall(text.lower()):
+        if piece[0] < "一":
+            tokens.append(piece)
+        elif len(piece) == 1:
+            tokens.append(piece)
+        else:
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+    return tokens
+
+
+def chunk_pages(pages, chunk_chars=500, overlap=80):
+    """把逐页文本切成带页码的小块：[(页码, 文本)]，相邻块之间保留少量重叠。"""
+    chunks = []
+    step = max(1, chunk_chars - overlap)
+    for page_no, text in enumerate(pages, start=1):
+        text = re.sub(r"\s+", " ", text or "").strip()
+        for start in range(0, len(text), step):
+            piece = text[start:start + chunk_chars]
+            if piece:
+                chunks.append((page_no, piece))
+            if start + chunk_chars >= len(text):
+                break
+    return chunks
+
+
+class BM25Index:
+    """基于 NumPy 倒排表的 BM25 索引。"""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        n = len(chunks)
+        lengths = np.zeros(n, dtype=np.float32)
+        postings = defaultdict(lambda: ([], []))
+        for i, (_, text) in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                docs, freqs = postings[term]
+                docs.append(i)
+                freqs.append(tf)
+
+        avg_len = float(lengths.mean()) if n else 1.0
+        # 预先算好每个文档的长度归一项，查询时只剩向量加法
+        self.norm = k1 * (1 - b + b * lengths / max(avg_len, 1.0))
+        self.postings = {}
+        for term, (docs, freqs) in postings.items():
+            df = len(docs)
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            self.postings[term] = (np.asarray(docs, dtype=np.int32), np.asarray(freqs, dtype=np.float32), idf)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query, k=4):
+        """返回 [(得分, 页码, 文本)]，按得分降序。"""
+        if not self.chunks:
+            return []
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            docs, freqs, idf = entry
+            scores[docs] += idf * freqs * (self.k1 + 1) / (freqs + self.norm[docs])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), *self.chunks[i]) for i in top if scores[i] > 0]
+
+
+def build_index(pages, chunk_chars=500, overlap=80):
+    return BM25Index(chunk_pages(pages, chunk_chars, overlap))
+
+
+def format_passages(hits, max_chars=1500):
+    """把检索结果拼成注入 prompt 的参考片段块，总长度受 max_chars 限制。"""
+    lines = []
+    used = 0
+    for _, page_no, text in hits:
+        if used + len(text) > max_chars and lines:
+            break
+        lines.append(f"[第{page_no}页] {text}")
+        used += len(text)
+    if not lines:
+        return ""
+    return "【检索到的参考片段】(仅供本轮引用)：\n" + "\n".join(lines)
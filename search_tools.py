@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+from response_cache import CACHE_DIR, SQLiteCache
+
+# ==========================================
+# 联网搜索层 (规范化查询缓存 + 并行扇出 + 可插拔后端)
+# ==========================================
+# 内存 LRU (带 TTL) 在前，SQLite 持久化缓存在后，重复或近似重复的查询几乎零延迟。
+# 一次请求多个查询时并行执行。后端可替换：
+#   ddgs   DuckDuckGo (默认)
+#   local  本地离线语料 (JSONL，每行 {"title", "href", "body"})，用于测试与离线演示
+# 由环境变量 DEBATE_SEARCH_BACKEND / DEBATE_SEARCH_CORPUS 选择。
+
+SEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "search_cache.sqlite")
+SEARCH_TTL = float(os.environ.get("DEBATE_SEARCH_TTL_HOURS", "24")) * 3600
+PUNCTUATION = re.compile(r"[\s,.;:!?，。；：！？、\"'“”‘’()（）]+")
+
+
+def normalize_query(query):
+    """大小写、空白与标点差异不影响缓存命中"""
+    return PUNCTUATION.sub(" ", query.lower()).strip()
+
+
+class DDGSBackend:
+    name = "ddgs"
+
+    def search(self, query, max_results=3):
+        from duckduckgo_search import DDGS
+
+        return DDGS().text(query, max_results=max_results) or []
+
+
+class LocalCorpusBackend:
+    """离线语料后端：用本地 BM25 索引模拟搜索引擎"""
+
+    name = "local"
+
+    def __init__(self, documents):
+        from retrieval import BM25Index
+
+        self.documents = documents
+        self.index = BM25Index([(i, f"{d.get('title', '')} {d.get('body', '')}") for i, d in enumerate(documents)])
+
+    @classmethod
+    def from_jsonl(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def search(self, query, max_results=3):
+        return [self.documents[doc_id] for _, doc_id, _ in self.index.search(query, k=max_results)]
+
+
+class SearchService:
+    """
+    带缓存的搜索入口。
+    参数: memory_size (内存 LRU 条数), ttl (缓存有效期，秒), max_workers (多查询并行数)
+    """
+
+    def __init__(self, backend, store=None, memory_size=256, ttl=SEARCH_TTL, max_workers=4):
+        self.backend = backend
+        self.store = store
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (写入时间, 结果)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+
+    def _key(self, query, max_results):
+        return f"{self.backend.name}:{max_results}:{normalize_query(query)}"
+
+    def _remember(self, key, results):
+        with self._lock:
+            self._memory[key] = (time.time(), results)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def search(self, query, max_results=3):
+        key = self._key(query, max_results)
+        with METRICS.timer("search", self.backend.name) as call:
+            with self._lock:
+                entry = self._memory.get(key)
+                if entry is not None and time.time() - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    call.cache_hit, call.extra["source"] = True, "memory"
+                    return entry[1]
+            results = self.store.get(key) if self.store is not None else None
+            call.cache_hit, call.extra["source"] = results is not None, "disk"
+            if results is None:
+                call.extra["source"] = "backend"
+                results = self.backend.search(query, max_results)
+                if self.store is not None and results:
+                    self.store.set(key, results)
+            self._remember(key, results)
+            return results
+
+    def search_many(self, queries, max_results=3):
+        """并行执行多个查询；规范化后相同的查询只执行一次。返回 {原查询: 结果}"""
+        unique = {}
+        for q in queries:
+            unique.setdefault(self._key(q, max_results), q)
+        futures = {key: self._pool.submit(self.search, q, max_results) for key, q in unique.items()}
+        return {q: futures[self._key(q, max_results)].result() for q in queries}
+
+
+def default_backend():
+    if os.environ.get("DEBATE_SEARCH_BACKEND", "ddgs") == "local":
+        return LocalCorpusBackend.from_jsonl(os.environ["DEBATE_SEARCH_CORPUS"])
+    return DDGSBackend()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_search_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = SearchService(default_backend(), SQLiteCache(SEARCH_CACHE_PATH, ttl=SEARCH_TTL))
+        return _service
+
+
+def format_results(query, results):
+    if not results:
+        return f"【{query}】未找到相关结果。"
+    summary = f"【{query}】\n"
+    for res in results:
+        summary += f"标题: {res.get('title', '')}\n链接: {res.get('href', '')}\n摘要: {res.get('body', '')}\n\n"
+    return summary
@@ -0,0 +1,399 @@
+import argparse
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_gateway import UPSTREAM_URL, RateLimiter
+from metrics import quantile
+
+# ==========================================
+# 多用户排队服务 (OpenAI 兼容代理)
+# ==========================================
+# 多个浏览器会话共用一个部署时，各会话不再各自直连 DeepSeek，而是把请求交给本服务：
+#   - 所有请求进入同一个调度器，由固定数量的 worker 线程转发给上游，上游并发 = worker 数；
+#   - 全局令牌桶限制整体请求速率，每个租户 (X-Debate-Tenant，通常是一个会话) 另有自己的令牌桶，
+#     一个用户的突发不会挤占其他人；
+#   - 优先级：辩手发言 (turn) > 文档摘要 (summary) > 预生成的下一轮 (speculative) > 逐轮评分 (judge) > 批量任务 (batch)，
+#     排队超过 AGING 秒的任务逐级提升优先级，低优先级任务不会被无限期饿死；
+#   - 后台任务 (speculative / judge / batch) 最多占用 worker 数 - reserve 个并发，始终留出 worker 给交互请求，
+#     大批评分涌入时发言不必等前面的慢请求结束；
+#   - 每个租户的排队长度有上限，超出直接返回 429 + Retry-After，由客户端网关退避重试，
+#     而不是无限排队拖长尾延迟；批量任务本身已由客户端并发数限定，单独使用更宽的 batch_queue 上限；
+#   - 空闲超过 TENANT_IDLE 秒、没有排队与在途请求的租户被清理，租户表不会随会话数无限增长；
+#   - 流式请求按上游的 SSE chunk 原样转发 (含 usage)，首 token 到达即回传。
+# 任务类别优先取请求头 X-Debate-Kind，否则由 X-Debate-Label (调用方) 推断。
+# 用法：
+#   python serving.py --port 8800 --workers 8 --rps 10 --tenant-rps 2
+#   DEBATE_SERVING_URL=http://127.0.0.1:8800/v1 streamlit run app.py
+# GET /v1/stats 返回各优先级的排队数、各租户的计数与排队等待的分位数。
+
+PRIORITIES = {"turn": 0, "summary": 1, "speculative": 2, "judge": 3, "batch": 4}
+BACKGROUND = PRIORITIES["speculative"]  # 此优先级及以下为后台任务，不占用为交互请求预留的 worker
+LABEL_KINDS = {"judge": "judge", "summary": "summary"}
+AGING = 5.0  # 每排队这么多秒，有效优先级提升一级
+TENANT_IDLE = 600.0  # 租户空闲这么多秒后从租户表中清理 (令牌桶早已回满，重建不影响限速)
+
+
+class QueueFull(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """一次排队的上游请求；结果以事件形式放进 events：("chunk", dict) / ("result", dict) / ("error", 状态码, dict) / ("end",)"""
+
+    def __init__(self, tenant, kind, body, api_key):
+        self.tenant = tenant
+        self.kind = kind
+        self.priority = PRIORITIES.get(kind, PRIORITIES["turn"])
+        self.body = body
+        self.api_key = api_key
+        self.enqueued = time.monotonic()
+        self.started = None
+        self.events = queue.Queue()
+        self.cancelled = False
+
+    def effective_priority(self, now):
+        return self.priority - int((now - self.enqueued) // AGING)
+
+
+class TenantState:
+    __slots__ = ("bucket", "queues", "queued", "in_flight", "served", "rejected", "last_seen")
+
+    def __init__(self, rate, burst):
+        self.bucket = RateLimiter(rate, burst)
+        self.queues = [deque() for _ in PRIORITIES]
+        self.queued = self.in_flight = self.served = self.rejected = 0
+        self.last_seen = time.monotonic()
+
+
+class Scheduler:
+    """
+    按 (有效优先级, 入队时间) 挑选下一个任务；候选只取令牌已就绪的租户，全局令牌桶再统一限速。
+    参数: rps / burst (全局), tenant_rps / tenant_burst (每个租户), tenant_queue (每个租户最多排队的交互请求数),
+    batch_queue (每个租户最多排队的批量任务数), max_queue (全局最多排队数),
+    background_slots (后台任务最多同时在途数，None 表示不限), idle_ttl (租户空闲多少秒后清理)
+    """
+
+    def __init__(self, rps=None, burst=None, tenant_rps=None, tenant_burst=None, tenant_queue=32, max_queue=512,
+                 background_slots=None, batch_queue=256, idle_ttl=TENANT_IDLE):
+        self.bucket = RateLimiter(rps, burst)
+        self.tenant_rps = tenant_rps
+        self.tenant_burst = tenant_burst
+        self.tenant_queue = tenant_queue
+        self.batch_queue = batch_queue
+        self.max_queue = max_queue
+        self.idle_ttl = idle_ttl
+        self._swept = time.monotonic()
+        self.tenants = {}
+        self.queued = 0
+        self.in_flight = 0
+        self.background_slots = background_slots
+        self.background = 0
+        self.waits = {kind: deque(maxlen=2000) for kind in PRIORITIES}
+        self._cond = threading.Condition()
+
+    def _tenant(self, name):
+        state = self.tenants.get(name)
+        if state is None:
+            state = self.tenants[name] = TenantState(self.tenant_rps, self.tenant_burst)
+        return state
+
+    def _evict_idle(self, now):
+        """清理空闲租户；每 idle_ttl / 10 秒最多扫描一次"""
+        if now - self._swept < self.idle_ttl / 10:
+            return
+        self._swept = now
+        for name in [name for name, s in self.tenants.items()
+                     if not s.queued and not s.in_flight and now - s.last_seen > self.idle_ttl]:
+            del self.tenants[name]
+
+    def submit(self, job):
+        with self._cond:
+            self._evict_idle(job.enqueued)
+            tenant = self._tenant(job.tenant)
+            tenant.last_seen = job.enqueued
+            batch = job.priority == PRIORITIES["batch"]
+            waiting = len(tenant.queues[job.priority]) if batch else tenant.queued - len(tenant.queues[PRIORITIES["batch"]])
+            if waiting >= (self.batch_queue if batch else self.tenant_queue) or self.queued >= self.max_queue:
+                tenant.rejected += 1
+                # 按较紧的那个速率粗略估计排空所需时间，供客户端退避
+                rates = [r for r in (self.tenant_rps, self.bucket.rate) if r]
+                raise QueueFull("排队已满，请稍后重试", max(1, math.ceil(waiting / min(rates))) if rates else 1)
+            tenant.queues[job.priority].append(job)
+            tenant.queued += 1
+            self.queued += 1
+            self._cond.notify()
+
+    def _pick(self, now):
+        """返回 (任务, 0) 或 (None, 建议等待秒数)"""
+        if not self.bucket.ready(now):
+            return None, self.bucket.wait_time()
+        best = None
+        wait = None
+        background_full = self.background_slots is not None and self.background >= self.background_slots
+        for state in self.tenants.values():
+            if not state.queued:
+                continue
+            if not state.bucket.ready(now):
+                w = state.bucket.wait_time()
+                wait = w if wait is None else min(wait, w)
+                continue
+            for priority, jobs in enumerate(state.queues):
+                if background_full and priority >= BACKGROUND:
+                    break
+                while jobs and jobs[0].cancelled:
+                    jobs.popleft()
+                    state.queued -= 1
+                    self.queued -= 1
+                if jobs:
+                    key = (jobs[0].effective_priority(now), jobs[0].enqueued)
+                    if best is None or key < best[0]:
+                        best = (key, state, jobs)
+        if best is None:
+            return None, wait
+        _, state, jobs = best
+        job = jobs.popleft()
+        state.queued -= 1
+        self.queued -= 1
+        state.bucket.take()
+        self.bucket.take()
+        return job, 0
+
+    def next_job(self):
+        """worker 调用：阻塞直到有可以发出的任务"""
+        with self._cond:
+            while True:
+                job, wait = self._pick(time.monotonic())
+                if job is not None:
+                    job.started = time.monotonic()
+                    self.in_flight += 1
+                    self.tenants[job.tenant].in_flight += 1
+                    self.background += job.priority >= BACKGROUND
+                    self.waits[job.kind].append(job.started - job.enqueued)
+                    return job
+                self._cond.wait(timeout=wait)
+
+    def done(self, job):
+        with self._cond:
+            self.in_flight -= 1
+            self.background -= job.priority >= BACKGROUND
+            tenant = self._tenant(job.tenant)
+            tenant.in_flight -= 1
+            tenant.served += 1
+            tenant.last_seen = time.monotonic()
+            self._cond.notify()  # 释放了后台名额，唤醒等待中的 worker
+
+    def stats(self):
+        with self._cond:
+            queued = {kind: 0 for kind in PRIORITIES}
+            for state in self.tenants.values():
+                for kind, jobs in zip(PRIORITIES, state.queues):
+                    queued[kind] += sum(1 for job in jobs if not job.cancelled)
+            return {
+                "queued": queued,
+                "in_flight": self.in_flight,
+                "background_in_flight": self.background,
+                "tenants": {
+                    name: {"queued": s.queued, "served": s.served, "rejected": s.rejected}
+                    for name, s in self.tenants.items()
+                },
+                "queue_wait": {
+                    kind: {"count": len(w), **{f"p{int(q * 100)}": round(quantile(list(w), q), 4) for q in (0.5, 0.95, 0.99)}}
+                    for kind, w in self.waits.items() if w
+                },
+            }
+
+
+class ServingService:
+    """调度器 + 上游客户端 + worker 线程；api_key 为空时使用请求自带的 Key 转发"""
+
+    def __init__(self, scheduler, upstream=UPSTREAM_URL, api_key=None, workers=8, timeout=120.0, retries=2):
+        self.scheduler = scheduler
+        self.upstream = upstream
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, name=f"serving-{i}", daemon=True) for i in range(workers)]
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def client(self, api_key):
+        """每个 Key 一个上游客户端，长连接复用"""
+        with self._clients_lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                from openai import OpenAI
+
+                client = OpenAI(api_key=api_key, base_url=self.upstream, timeout=self.timeout, max_retries=self.retries)
+                self._clients[api_key] = client
+            return client
+
+    def _work(self):
+        import openai
+
+        while True:
+            job = self.scheduler.next_job()
+            try:
+                if job.cancelled:
+                    continue
+                response = self.client(job.api_key).chat.completions.create(**job.body)
+                if job.body.get("stream"):
+                    for chunk in response:
+                        if job.cancelled:
+                            response.close()
+                            break
+                        job.events.put(("chunk", chunk.to_dict()))
+                else:
+                    job.events.put(("result", response.to_dict()))
+                job.events.put(("end",))
+            except openai.APIStatusError as e:
+                job.events.put(("error", e.status_code, e.body if isinstance(e.body, dict) else {"message": str(e)}))
+            except Exception as e:
+                job.events.put(("error", 502, {"message": f"{type(e).__name__}: {e}", "type": "upstream_error"}))
+            finally:
+                self.scheduler.done(job)
+
+
+def classify(headers):
+    kind = headers.get("X-Debate-Kind")
+    if kind in PRIORITIES:
+        return kind
+    return LABEL_KINDS.get(headers.get("X-Debate-Label", ""), "turn")
+
+
+class ServingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # 默认 backlog 只有 5，突发连接会被丢弃并在 1s 后重传 SYN，抬高尾延迟
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, payload, headers=()):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _error(self, status, error, headers=()):
+            self._json(status, {"error": error if isinstance(error, dict) else {"message": str(error)}}, headers)
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path.endswith("/stats"):
+                self._json(200, service.scheduler.stats())
+            elif path.endswith("/models"):
+                self._json(200, {"object": "list", "data": [{"id": "deepseek-chat", "object": "model"}]})
+            else:
+                self._error(404, "not found")
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._error(404, "not found")
+                return
+            api_key = service.api_key or self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+            tenant = self.headers.get("X-Debate-Tenant") or "anonymous"
+            job = Job(tenant, classify(self.headers), body, api_key)
+            try:
+                service.scheduler.submit(job)
+            except QueueFull as e:
+                self._error(429, {"message": str(e), "type": "queue_full"}, [("Retry-After", str(e.retry_after))])
+                return
+
+            # 等到第一个事件再决定响应：上游报错时原样返回状态码，客户端网关据此重试
+            try:
+                event = job.events.get(timeout=service.timeout * 2)
+            except queue.Empty:
+                job.cancelled = True
+                self._error(504, "排队超时")
+                return
+            if event[0] == "error":
+                self._error(event[1], event[2])
+            elif event[0] == "result":
+                self._json(200, event[1])
+            else:
+                self._stream(job, event)
+
+        def _stream(self, job, event):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                while event[0] == "chunk":
+                    self.wfile.write(f"data: {json.dumps(event[1], ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    event = job.events.get(timeout=service.timeout)
+                if event[0] == "error":
+                    self.wfile.write(f"data: {json.dumps({'error': event[2]}, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (OSError, queue.Empty):
+                job.cancelled = True  # 客户端断开：worker 停止转发，释放上游连接
+
+    return Handler
+
+
+def start_serving(host="127.0.0.1", port=0, service=None):
+    """在后台线程启动排队服务，返回 (server, base_url)；port=0 时自动选择空闲端口"""
+    service = service or ServingService(Scheduler()).start()
+    server = ServingHTTPServer((host, port), make_handler(service))
+    server.service = service
+    threading.Thread(target=server.serve_forever, name="serving", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多用户排队服务：全局 / 租户令牌桶限速 + 优先级调度，OpenAI 兼容")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help="上游地址 (DeepSeek 或 mock_server.py)")
+    parser.add_argument("--api-key", default=os.environ.get("DEEPSEEK_API_KEY", ""), help="转发用的 Key，留空则使用请求自带的 Key")
+    parser.add_argument("--workers", type=int, default=8, help="上游并发数")
+    parser.add_argument("--reserve", type=int, default=2, help="为交互请求 (发言 / 摘要) 预留的 worker 数")
+    parser.add_argument("--rps", type=float, default=None, help="全局每秒请求数上限")
+    parser.add_argument("--burst", type=int, default=None)
+    parser.add_argument("--tenant-rps", type=float, default=None, help="每个租户每秒请求数上限")
+    parser.add_argument("--tenant-burst", type=int, default=None)
+    parser.add_argument("--tenant-queue", type=int, default=32, help="每个租户最多排队的交互请求数，超出返回 429")
+    parser.add_argument("--batch-queue", type=int, default=256, help="每个租户最多排队的批量任务数")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    scheduler = Scheduler(args.rps, args.burst, args.tenant_rps, args.tenant_burst, args.tenant_queue,
+                          background_slots=max(1, args.workers - args.reserve), batch_queue=args.batch_queue)
+    service = ServingService(scheduler, args.upstream, args.api_key or None, args.workers, args.timeout).start()
+    server = ServingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"排队服务已启动：http://{args.host}:{args.port}/v1 -> {args.upstream}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(scheduler.stats(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
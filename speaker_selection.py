@@ -0,0 +1,48 @@
+import os
+
+# ==========================================
+# 群聊发言顺序 (规则状态机)
+# ==========================================
+# 辩论的发言顺序是固定的：辩手发起工具调用 -> 裁判执行工具 -> 该辩手拿到结果后发言 -> 轮到对方。
+# 用状态机直接决定下一位发言者，省掉 GroupChatManager 每轮一次的 LLM 选人请求。
+# DEBATE_SPEAKER_MODE=llm 时仍可退回 AutoGen 默认的 LLM 选人 ("auto")。
+
+SPEAKER_MODE = os.environ.get("DEBATE_SPEAKER_MODE", "rule").lower()
+
+
+def _requests_tool(message):
+    return bool(message.get("function_call") or message.get("tool_calls"))
+
+
+def make_debate_selector(pro_agent, con_agent, executor):
+    """
+    返回供 GroupChat(speaker_selection_method=...) 使用的选人函数。
+    executor 为真正执行工具的 Agent (本项目中是裁判 UserProxy)。
+    """
+    opponent = {pro_agent.name: con_agent, con_agent.name: pro_agent}
+
+    def select(last_speaker, groupchat):
+        messages = groupchat.messages
+        if not messages:
+            return pro_agent
+        last = messages[-1]
+        # 1. 辩手发起了工具调用 -> 交给裁判执行
+        if _requests_tool(last):
+            return executor
+        if last_speaker is executor:
+            # 2. 工具结果 -> 还给发起调用的辩手
+            if len(messages) >= 2 and _requests_tool(messages[-2]):
+                return groupchat.agent_by_name(messages[-2]["name"])
+            # 3. 开场发言 -> 正方先说
+            return pro_agent
+        # 4. 辩手完成发言 -> 轮到对方
+        return opponent.get(last_speaker.name, pro_agent)
+
+    return select
+
+
+def speaker_selection_method(pro_agent, con_agent, executor, mode=SPEAKER_MODE):
+    """rule 模式返回状态机选人函数，llm 模式返回 AutoGen 默认的 "auto" """
+    if mode == "llm":
+        return "auto"
+    return make_debate_selector(pro_agent, con_agent, executor)
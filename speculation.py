@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================
+# 推测式预生成 (下一轮发言提前在后台生成)
+# ==========================================
+# 没有待执行的锦囊时，下一位辩手的发言只取决于已有记录，可以在上一轮落地后立刻在后台生成。
+# 每份预生成结果都绑定一个 key (发言方 + 轮次 + 记录条数)，状态一变 key 就对不上，结果直接作废；
+# 用户递了纸条也会作废，改为按新指令重新生成。
+# 预生成以任务类别 "speculative" 发给排队服务，优先级低于真正的发言；
+# 只有被采用的发言才记入人设的长度统计，作废的结果不影响 max_tokens 预算。
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculate")
+
+
+class Speculation:
+    """一份预生成：后台线程边生成边把片段写入缓冲区，取用时可从头跟随读取，不必等整轮生成完。"""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.pieces = []
+        self.done = False
+        self.error = None
+        self.cancelled = False
+        self.future = None
+        self._cond = threading.Condition()
+
+    def run(self, messages):
+        from streaming import stream_agent_reply
+
+        chunks = stream_agent_reply(self.agent, messages, kind="speculative", record=False)
+        try:
+            for piece in chunks:
+                if self.cancelled:
+                    break  # 已作废：关闭流，服务端随之停止生成
+                with self._cond:
+                    self.pieces.append(piece)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            chunks.close()
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    def follow(self):
+        """逐块产出已生成与后续生成的片段；生成失败时抛出原异常。读完即把这轮发言记入长度统计，并返回裁剪后的发言。"""
+        index = 0
+        while True:
+            with self._cond:
+                while index == len(self.pieces) and not self.done:
+                    self._cond.wait()
+                new, finished = self.pieces[index:], self.done
+            index += len(new)
+            yield from new
+            if finished and index == len(self.pieces):
+                break
+        if self.error is not None:
+            raise self.error
+        return self.agent.finish_turn("".join(self.pieces))
+
+
+class Speculator:
+    """单个会话的预生成槽位：同一时刻最多保留一份结果。"""
+
+    def __init__(self):
+        self.key = None
+        self.current = None
+
+    def start(self, key, agent, messages):
+        """为 key 启动预生成；同一 key 已在进行中则什么都不做"""
+        if self.key == key and self.current is not None:
+            return
+        self.discard()
+        self.key = key
+        self.current = Speculation(agent)
+        self.current.future = _executor.submit(self.current.run, messages)
+
+    def ready(self, key):
+        return self.key == key and self.current is not None and self.current.done and self.current.error is None
+
+    def take(self, key):
+        """
+        取出 key 对应的预生成，返回逐块产出发言的迭代器 (仍在生成时边生成边产出)。
+        key 不匹配或尚未启动时返回 None；迭代中生成失败会抛出异常，由调用方改走正常生成流程。
+        """
+        if self.key != key or self.current is None:
+            self.discard()
+            return None
+        speculation = self.current
+        self.key, self.current = None, None
+        return speculation.follow()
+
+    def discard(self):
+        """作废当前预生成：尚未开始的直接取消，正在生成的在下一个片段处断开，结果丢弃"""
+        if self.current is not None:
+            self.current.cancelled = True
+            self.current.future.cancel()
+        self.key, self.current = None, None
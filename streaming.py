@@ -0,0 +1,59 @@
+import time
+
+from llm_gateway import gateway_for
+
+# ==========================================
+# 流式生成工具
+# ==========================================
+# 直接读取 Agent 的消息前缀 (共享资料 + 人设) 与 llm_config，
+# 经共享的 LLM 网关走 stream=True 通道，避免等整轮生成完再"假打字"。
+
+
+def stream_agent_reply(agent, messages, kind=None, record=True):
+    """
+    以流式方式生成 Agent 的一轮发言，逐块产出文本片段。
+    辩手发言在核心论点行写完或出现下一轮标记时提前结束，结束后记入该人设的长度统计。
+    kind: 排队服务中的任务类别 (预生成为 "speculative")；record=False 时不记长度统计，由调用方在采用该发言时再记录。
+    生成器的返回值是裁剪后的整轮发言，用 consume / render_stream 读取，存档与界面保存的都是这份文本。
+    """
+    gateway = gateway_for(agent.config)
+    pieces = []
+    for piece in gateway.stream(agent.build_messages(messages), model=agent.config["model"], label=agent.name,
+                                cutter=agent.cutter(), kind=kind, **agent.sampling()):
+        pieces.append(piece)
+        yield piece
+    return agent.finish_turn("".join(pieces), record=record)
+
+
+def consume(chunks, on_text):
+    """
+    逐块读取 chunks，每块之后以累计文本调用 on_text(text)。
+    返回生成器的返回值 (裁剪后的整轮发言)；生成器没有返回值时返回累计文本。
+    """
+    text = ""
+    chunks = iter(chunks)
+    while True:
+        try:
+            piece = next(chunks)
+        except StopIteration as stop:
+            return text if stop.value is None else stop.value
+        text += piece
+        on_text(text)
+
+
+def render_stream(chunks, render, min_interval=0.08, min_chars=16):
+    """
+    合并渲染批次：累计到 min_chars 个字符或距上次刷新超过 min_interval 秒才重绘一次。
+    render(text, done) 负责把当前文本写进组件；返回完整文本 (生成器返回裁剪后的发言时以它为准，并按它重绘)。
+    """
+    state = {"drawn": 0, "last_flush": 0.0}
+
+    def on_text(text):
+        now = time.monotonic()
+        if len(text) - state["drawn"] >= min_chars or now - state["last_flush"] >= min_interval:
+            render(text, False)
+            state["drawn"], state["last_flush"] = len(text), now
+
+    text = consume(chunks, on_text)
+    render(text, True)
+    return text
@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================
+# Map-Reduce 文档摘要
+# ==========================================
+# map：把全文切块并发摘要 (限制同时在途的请求数)；
+# reduce：把分块摘要合并成 5-8 个核心论点，分块摘要过多时逐层合并。
+# 全文都被覆盖，墙钟时间接近一次 map 调用 + 一次 reduce 调用。
+
+MAP_PROMPT = "以下是一份长文档的第 {index}/{total} 部分。请用要点列出其中的论点、关键数据和争议焦点，不超过 200 字。\n内容：\n{text}"
+REDUCE_PROMPT = "以下是同一份文档各部分的要点摘要。请合并去重，提炼出 5-8 个核心论点、关键数据或争议焦点。\n{text}"
+
+
+def split_text(text, chunk_chars=6000):
+    """按段落边界把全文切成不超过 chunk_chars 的块。"""
+    chunks = []
+    current = []
+    size = 0
+    for para in text.split("\n"):
+        if size + len(para) > chunk_chars and current:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        while len(para) > chunk_chars:
+            chunks.append(para[:chunk_chars])
+            para = para[chunk_chars:]
+        current.append(para)
+        size += len(para) + 1
+    if "".join(current).strip():
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _ask(gateway, prompt):
+    text, _ = gateway.complete([{"role": "user", "content": prompt}], label="summary")
+    return text
+
+
+def map_reduce_summary(gateway, text, chunk_chars=6000, max_in_flight=8, reduce_chars=8000):
+    """
+    返回 {"summary", "chunks", "errors", "timings"}。
+    timings 记录 map / reduce / total 各阶段耗时 (秒)，以及每个分块请求的耗时。
+    部分分块失败时仍用成功的部分继续；全部失败则抛出异常，由调用方决定如何降级。
+    """
+    started = time.perf_counter()
+    chunks = split_text(text, chunk_chars)
+    total = len(chunks)
+    chunk_latency = [0.0] * total
+    errors = []
+
+    def summarize_chunk(i):
+        t0 = time.perf_counter()
+        try:
+            return _ask(gateway, MAP_PROMPT.format(index=i + 1, total=total, text=chunks[i]))
+        except Exception as e:
+            errors.append(f"chunk {i + 1}: {e}")
+            return None
+        finally:
+            chunk_latency[i] = time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, total))) as pool:
+        partials = [p for p in pool.map(summarize_chunk, range(total)) if p]
+    map_done = time.perf_counter()
+    if not partials:
+        raise RuntimeError(f"所有分块摘要均失败：{errors[:3]}")
+
+    # reduce：一次放不下时，先分组合并再继续，直到能一次完成
+    levels = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        while len(partials) > 1 and sum(len(p) for p in partials) > reduce_chars and levels < 3:
+            groups = split_text("\n\n".join(partials), reduce_chars)
+            partials = list(pool.map(lambda g: _ask(gateway, REDUCE_PROMPT.format(text=g)), groups))
+            levels += 1
+    summary = _ask(gateway, REDUCE_PROMPT.format(text="\n\n".join(partials)))
+    finished = time.perf_counter()
+
+    return {
+        "summary": summary,
+        "chunks": total,
+        "errors": errors,
+        "timings": {
+            "map": map_done - started,
+            "reduce": finished - map_done,
+            "reduce_levels": levels + 1,
+            "total": finished - started,
+            "chunk_latency": chunk_latency,
+        },
+    }
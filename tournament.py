@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+
+from batch_runner import play_debate
+from context_pack import pack_context
+from debate_core import (CATEGORIES, CONTEXT_NOTE, JUDGE_SYSTEM, DebateAgent, analyst_config,
+                         build_system_prompt, debater_config)
+from llm_gateway import BASE_URL, RetryPolicy, get_gateway
+
+# ==========================================
+# 循环赛：同一议题下 N 个人设两两对辩，Elo 排名
+# ==========================================
+# 每个 (人设, 持方) 的 System Prompt 只构建一次，所有场次共用同一个 Agent 对象；
+# 参考资料只检索 / 打包一次，作为所有 Agent 共用的前缀消息，而不是复制进每个人设 Prompt，
+# 因此所有场次的请求都以同一前缀开头，可以命中服务端的前缀缓存。
+# 场次在有界的并发池 (asyncio.Semaphore + 网关令牌桶) 上调度，总耗时约为 场次数 × 单场耗时 / 并发数；
+# 每场结束立即增量更新 Elo 并写出结果。
+#
+# 用法：
+#   python tournament.py bracket.json -o matches.jsonl --standings standings.json --concurrency 16
+# 配置示例：
+#   {"topic": "AI 会取代程序员吗？", "personas": ["资深架构师", "AI 伦理专家", "应届毕业生"],
+#    "context_file": "report.pdf", "rounds": 4}
+
+
+class EloTable:
+    """增量 Elo：每场结果到达即更新，胜 1 / 平 0.5 / 负 0"""
+
+    def __init__(self, players, initial=1500.0, k=32.0):
+        self.k = k
+        self.ratings = {p: float(initial) for p in players}
+        self.records = {p: {"W": 0, "D": 0, "L": 0, "points": 0} for p in players}
+
+    def expected(self, a, b):
+        return 1.0 / (1.0 + 10 ** ((self.ratings[b] - self.ratings[a]) / 400))
+
+    def update(self, a, b, score_a, points_a=0, points_b=0):
+        """score_a: a 方实际得分 (1 / 0.5 / 0)；points: 本场裁判总分，用于同分时排序"""
+        delta = self.k * (score_a - self.expected(a, b))
+        self.ratings[a] += delta
+        self.ratings[b] -= delta
+        for player, result, points in ((a, score_a, points_a), (b, 1 - score_a, points_b)):
+            self.records[player]["W" if result == 1 else "L" if result == 0 else "D"] += 1
+            self.records[player]["points"] += points
+
+    def standings(self):
+        rows = [
+            {"persona": p, "elo": round(r, 1), **self.records[p]}
+            for p, r in self.ratings.items()
+        ]
+        return sorted(rows, key=lambda row: (-row["elo"], -row["points"]))
+
+
+def load_context(config, base_dir="."):
+    """参考资料：context 文本，或 context_file (txt / pdf)。PDF 走解析缓存 + BM25 按议题检索。"""
+    if config.get("context"):
+        return config["context"]
+    path = config.get("context_file")
+    if not path:
+        return ""
+    path = os.path.join(base_dir, path)
+    if not path.lower().endswith(".pdf"):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    from pdf_cache import extract_pages
+    from retrieval import build_index, format_passages
+
+    with open(path, "rb") as f:
+        pages = extract_pages(f.read())
+    index = build_index(pages)
+    return format_passages(index.search(config["topic"], k=6)) or "".join(pages)[:1500]
+
+
+def build_roster(api_key, personas, context_text):
+    """每个 (人设, 持方) 只构建一次 Agent；参考资料打包一次后共用，Prompt 中只留指引，不内嵌正文"""
+    context = pack_context(context_text)
+    note = CONTEXT_NOTE if context.text else ""
+    llm_config = {"config_list": [debater_config(api_key)]}
+    roster = {
+        (persona, side): DebateAgent(side, system_message=build_system_prompt(side, persona, note),
+                                     llm_config=llm_config, context=context, persona=persona)
+        for persona in personas for side in ("Pro", "Con")
+    }
+    analyst = DebateAgent("Analyst", system_message=JUDGE_SYSTEM, llm_config={"config_list": [analyst_config(api_key)]})
+    return roster, analyst
+
+
+def schedule(personas, both_sides=False):
+    """循环赛对阵：每对人设一场 (持方按序号交替)，both_sides 时互换持方再打一场"""
+    pairs = []
+    for i, (a, b) in enumerate(itertools.combinations(personas, 2)):
+        pairs.append((a, b) if i % 2 == 0 else (b, a))
+        if both_sides:
+            pairs.append((b, a) if i % 2 == 0 else (a, b))
+    return pairs
+
+
+def outcome(verdict):
+    """裁判总分 -> (正方实际得分, 正方总分, 反方总分)；未决 (某方没有有效评分) 时返回 None"""
+    if verdict.get("Winner") is None:
+        return None
+    pro = sum(verdict["Pro"][c] for c in CATEGORIES)
+    con = sum(verdict["Con"][c] for c in CATEGORIES)
+    return (1.0 if pro > con else 0.0 if pro < con else 0.5), pro, con
+
+
+async def run_tournament(config, args, out):
+    personas = list(dict.fromkeys(config["personas"]))
+    if len(personas) < 2:
+        raise ValueError("至少需要 2 个人设")
+    topic = config["topic"]
+    rounds = int(config.get("rounds", args.rounds))
+    context = load_context(config, os.path.dirname(os.path.abspath(args.config)))
+    roster, analyst = build_roster(args.api_key, personas, context)
+    pairs = schedule(personas, args.both_sides)
+
+    gateway = get_gateway(
+        args.api_key, args.base_url, tenant="batch", kind="batch", max_concurrency=args.concurrency, rps=args.rps,
+        policy=RetryPolicy(timeout=args.timeout, max_retries=args.retries),
+    )
+    slots = asyncio.Semaphore(args.concurrency)
+    elo = EloTable(personas, k=args.k)
+
+    async def match(index, pro, con):
+        async with slots:
+            agents = {"Pro": roster[(pro, "Pro")], "Con": roster[(con, "Con")]}
+            record = {"id": f"m{index}", "topic": topic, "pro": pro, "con": con}
+            return await play_debate(gateway, agents, analyst, topic, {"Pro": pro, "Con": con}, rounds, record)
+
+    print(f"{len(personas)} 个人设，{len(pairs)} 场，并发 {args.concurrency}", file=sys.stderr)
+    tasks = [asyncio.create_task(match(i, pro, con)) for i, (pro, con) in enumerate(pairs, start=1)]
+    failed = 0
+    for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+        record = await task
+        if "error" in record or not record.get("verdict"):
+            failed += 1
+            status = record.get("error", "无裁决")
+        elif outcome(record["verdict"]) is None:
+            # 评分不足的对局不计入 Elo，避免把评分失败当成负局
+            failed += 1
+            record["undecided"] = True
+            status = "未决"
+        else:
+            score, pro_points, con_points = outcome(record["verdict"])
+            elo.update(record["pro"], record["con"], score, pro_points, con_points)
+            record["elo"] = {p: round(elo.ratings[p], 1) for p in (record["pro"], record["con"])}
+            status = f"{pro_points}:{con_points}"
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        leader = elo.standings()[0]
+        print(f"[{done}/{len(pairs)}] {record['pro']} vs {record['con']} {status} "
+              f"({record['elapsed']}s) 领先：{leader['persona']} {leader['elo']}", file=sys.stderr)
+    await gateway.aclose()
+    return elo, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="多人设循环赛：两两对辩，按裁判评分增量计算 Elo 排名")
+    parser.add_argument("config", help="赛程 JSON：topic、personas，可选 rounds / context / context_file")
+    parser.add_argument("-o", "--output", default="matches.jsonl", help="逐场结果 JSONL 输出路径")
+    parser.add_argument("--standings", default="standings.json", help="最终排名 JSON 输出路径")
+    parser.add_argument("--api-key", default=os.environ.get("DEEPSEEK_API_KEY", ""))
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--rounds", type=int, default=4, help="每场发言总次数")
+    parser.add_argument("--both-sides", action="store_true", help="每对人设互换持方各打一场")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的场次数")
+    parser.add_argument("--rps", type=float, default=4.0, help="全局每秒请求数上限")
+    parser.add_argument("--retries", type=int, default=4, help="单次调用的最大重试次数")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单次调用超时 (秒)")
+    parser.add_argument("--k", type=float, default=32.0, help="Elo K 系数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.api_key:
+        sys.exit("请通过 --api-key 或环境变量 DEEPSEEK_API_KEY 提供 API Key")
+    with open(args.config, encoding="utf-8") as f:
+        config = json.load(f)
+    with open(args.output, "w", encoding="utf-8") as out:
+        elo, failed = asyncio.run(run_tournament(config, args, out))
+    standings = elo.standings()
+    with open(args.standings, "w", encoding="utf-8") as f:
+        json.dump({"topic": config["topic"], "standings": standings}, f, ensure_ascii=False, indent=2)
+    for rank, row in enumerate(standings, start=1):
+        print(f"{rank}. {row['persona']}  Elo {row['elo']}  {row['W']}胜 {row['D']}平 {row['L']}负", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
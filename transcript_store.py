@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from response_cache import CACHE_DIR
+
+# ==========================================
+# 辩论记录存储 (SQLite) + 有界内存会话
+# ==========================================
+# 每个浏览器会话只在内存里保留最近 window 条发言，更早的发言写在 SQLite 里按需分页读取，
+# 会话数量再多，单个会话的内存占用也是常数。
+
+TRANSCRIPT_PATH = os.path.join(CACHE_DIR, "transcripts.sqlite")
+TRANSCRIPT_TTL = float(os.environ.get("DEBATE_TRANSCRIPT_TTL_HOURS", "72")) * 3600
+
+
+class Message:
+    """一条发言记录；用 __slots__ 省掉每条记录的 __dict__"""
+
+    __slots__ = ("seq", "speaker", "content", "round")
+
+    def __init__(self, seq, speaker, content, round=None):
+        self.seq = seq
+        self.speaker = speaker
+        self.content = content
+        self.round = round
+
+
+class TranscriptStore:
+    """所有会话共用的记录表，按 (session_id, seq) 存取。"""
+
+    def __init__(self, path=TRANSCRIPT_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session_id TEXT, seq INTEGER, speaker TEXT, content TEXT, round INTEGER, created REAL, "
+                "PRIMARY KEY (session_id, seq))"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, session_id, message):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, message.seq, message.speaker, message.content, message.round, time.time()),
+            )
+
+    def page(self, session_id, start, stop):
+        """读取 seq 位于 [start, stop) 的发言"""
+        rows = self._conn().execute(
+            "SELECT seq, speaker, content, round FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (session_id, start, stop),
+        ).fetchall()
+        return [Message(*row) for row in rows]
+
+    def delete(self, session_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def purge(self, ttl=TRANSCRIPT_TTL):
+        """清理超过 ttl 秒未更新的会话"""
+        with self._conn() as conn:
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN "
+                "(SELECT session_id FROM messages GROUP BY session_id HAVING MAX(created) < ?)",
+                (time.time() - ttl,),
+            )
+
+
+class Transcript:
+    """
+    单个会话的发言记录。
+    参数: window (常驻内存的最近发言条数)
+    checkpoint: 可选的辩论存档 (checkpoint.Checkpoint)，每条发言同时追加写入，供重启后恢复
+    """
+
+    def __init__(self, store, session_id=None, window=12):
+        self.store = store
+        self.session_id = session_id or uuid.uuid4().hex
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.checkpoint = None
+
+    def __len__(self):
+        return self.count
+
+    def append(self, speaker, content, round=None):
+        message = Message(self.count, speaker, content, round)
+        self.store.append(self.session_id, message)
+        if self.checkpoint is not None:
+            self.checkpoint.record_turn(speaker, content, round)
+        self.recent.append(message)
+        self.count += 1
+        return message
+
+    @property
+    def offloaded(self):
+        """已移出内存、只在磁盘上的发言条数"""
+        return self.count - len(self.recent)
+
+    def page(self, start, stop):
+        """按 seq 区间取发言：内存里有的直接用，其余从磁盘读"""
+        first_cached = self.offloaded
+        older = self.store.page(self.session_id, start, min(stop, first_cached)) if start < first_cached else []
+        return older + [m for m in self.recent if start <= m.seq < stop]
+
+    def __iter__(self):
+        return iter(self.page(0, self.count))
+
+    def clear(self):
+        self.store.delete(self.session_id)
+        self.session_id = uuid.uuid4().hex
+        self.recent.clear()
+        self.count = 0
+        self.checkpoint = None
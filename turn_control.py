@@ -0,0 +1,151 @@
+import math
+import re
+import threading
+from collections import deque
+
+from debate_memory import CORE_PATTERN, estimate_tokens
+from metrics import quantile
+from response_cache import CACHE_MODE
+
+# ==========================================
+# 发言长度控制 (停止序列 + 流式提前结束 + 按人设自适应 max_tokens)
+# ==========================================
+# 辩手常在【核心论点】行之后继续发挥，或者替对方写出下一轮 ("反方：...")，
+# 这些 token 都要付费等待，随后又被 STOP_PROMPT 的规则判为无效。这里从三处收紧：
+#   TURN_STOPS     交给 API 的停止序列：一出现下一位发言人的标记，服务端立即停止生成
+#   TurnCutter     流式读取时判断本轮是否已结束 (核心论点行写完 / 出现第二轮标记)，结束即断开连接
+#   LengthBudget   按人设记录最近发言的长度，max_tokens 取近期 p90 加余量，而不是固定 500
+# 非流式调用同样经 TurnCutter 裁剪，保证存档、评分与上下文里只有一轮发言。
+
+# 只停在带冒号的发言人标记上：不带冒号的 "**反方的三个谬误**" 之类是发言内的小标题
+TURN_STOPS = ["\n正方：", "\n反方：", "\n正方:", "\n反方:", "\nPro:", "\nCon:", "\n**正方：", "\n**反方："]
+# 另起一行的发言人标记，如 "反方："、"**🟥 反方 (伦理专家):**"、"【正方】："、"Con:"
+SPEAKER_PATTERN = re.compile(
+    r"\n[ \t]*(?:\*\*|【)?[ \t]*(?:🟦|🟥)?[ \t]*(?:正方|反方|Pro|Con)(?:辩手)?[ \t]*"
+    r"(?:[（(][^）)\n]{0,24}[）)])?[ \t]*(?:\*\*|】)?[ \t]*[:：]"
+)
+# 核心论点行写完：冒号后有内容并以换行结束
+CORE_DONE_PATTERN = re.compile(r"【核心论点】[^\n]{0,8}?[:：]\s*\S[^\n]*\n")
+MARKER_LEADS = ("*", "【", "正", "反", "P", "C", "🟦", "🟥")
+
+
+class TurnCutter:
+    """
+    流式裁剪一轮发言：feed(片段) 返回可以立即输出的文本，done 为 True 时本轮已结束，应停止读取；
+    流正常结束后调用 flush() 取出暂存的尾部。
+    新起一行的开头若可能是发言人标记 (以 "反"、"**" 等开头)，先暂存到能判断为止，其余文本直接放行。
+    """
+
+    def __init__(self):
+        self.text = ""      # 已放行的文本
+        self.pending = ""   # 暂存、尚未放行的尾部
+        self.done = False
+
+    def feed(self, piece):
+        if self.done:
+            return ""
+        full = self.text + self.pending + piece
+        cut = None
+        core = CORE_DONE_PATTERN.search(full)
+        if core:
+            cut = core.end() - 1
+        # 只在第一行之后查找第二轮标记 (开头的自我介绍不算)
+        speaker = SPEAKER_PATTERN.search(full, max(0, len(self.text) - 1))
+        if speaker and speaker.start() > 0 and (cut is None or speaker.start() < cut):
+            cut = speaker.start()
+        if cut is not None:
+            self.done = True
+            out = full[len(self.text):cut].rstrip()
+            self.text = (self.text + out) if out else self.text
+            self.pending = ""
+            return out
+
+        line_start = full.rfind("\n")
+        hold = line_start >= len(self.text) and self._maybe_marker(full[line_start + 1:])
+        keep = line_start if hold else len(full)
+        while hold and keep > len(self.text) and full[keep - 1] in " \t\n":
+            keep -= 1  # 标记前的空行一起暂存，被裁掉时不留多余换行
+        out = full[len(self.text):keep]
+        self.text += out
+        self.pending = full[keep:]
+        return out
+
+    @staticmethod
+    def _maybe_marker(line):
+        line = line.lstrip(" \t")
+        return len(line) < 40 and (not line or line.startswith(MARKER_LEADS))
+
+    def flush(self):
+        out = "" if self.done else self.pending.rstrip()
+        self.text += out
+        self.pending = ""
+        return out
+
+    def trim(self, text):
+        """一次性裁剪完整文本 (非流式调用、缓存命中)"""
+        out = self.feed(text)
+        return out + self.flush()
+
+
+def trim_turn(text):
+    return TurnCutter().trim(text or "")
+
+
+class LengthBudget:
+    """
+    一个人设的发言长度预算。
+    max_tokens = 最近 window 轮发言长度 (估算 token) 的 p90 × headroom，按 step 向上取整，限制在 [floor, ceiling]；
+    样本少于 min_samples 时用 ceiling。缺少【核心论点】行的发言视为被截断，按 当时预算 × 2 记录，使预算回升。
+    """
+
+    def __init__(self, ceiling=500, floor=160, window=20, headroom=1.3, min_samples=3, step=32):
+        self.ceiling = ceiling
+        self.floor = floor
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.step = step
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def max_tokens(self):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return self.ceiling
+            # 取整到 step：预算小幅波动时请求参数不变，响应缓存仍能命中
+            budget = math.ceil(quantile(list(self.samples), 0.9) * self.headroom / self.step) * self.step
+        return max(self.floor, min(self.ceiling, budget))
+
+    def observe(self, text):
+        if not text:
+            return
+        tokens = estimate_tokens(text)
+        if not CORE_PATTERN.search(text):
+            tokens = max(tokens, self.max_tokens * 2)
+        with self._lock:
+            self.samples.append(tokens)
+
+
+class LengthBudgets:
+    """进程内按人设共享的长度预算 (线程安全)"""
+
+    def __init__(self):
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def get(self, persona, ceiling=500):
+        with self._lock:
+            budget = self._budgets.get(persona)
+            if budget is None:
+                budget = self._budgets[persona] = LengthBudget(ceiling)
+            return budget
+
+    def snapshot(self):
+        with self._lock:
+            items = list(self._budgets.items())
+        return {persona: {"max_tokens": b.max_tokens, "samples": len(b.samples)} for persona, b in items}
+
+
+# replay 模式下请求参数必须与录制时一致，不做自适应
+ADAPTIVE = CACHE_MODE != "replay"
+BUDGETS = LengthBudgets()